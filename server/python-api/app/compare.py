@@ -1,23 +1,23 @@
-import pandas as pd
-import numpy as np
+import polars as pl
 from pathlib import Path
 
 
 files = sorted(Path(".").glob("**/eval_all_jds_grid_partial*.csv"))  # adjust pattern
-df = pd.concat((pd.read_csv(f) for f in files), ignore_index=True)
+# lazy scan: rows are streamed through the aggregation instead of concatenated in memory
+lf = pl.scan_csv([str(f) for f in files])
 
 
 
-TOPK = int(df['topk'].iloc[0])  # e.g., 10
+TOPK = int(lf.select(pl.first("topk")).collect().item())  # e.g., 10
 
 summary = (
-    df.groupby(["mode","alpha","pool"], as_index=False)
-      .agg({f"MRR@{TOPK}":"mean", f"nDCG@{TOPK}":"mean", f"Recall@{TOPK}":"mean"})
-      .rename(columns={f"MRR@{TOPK}":"MRR_mean",
-                       f"nDCG@{TOPK}":"nDCG_mean",
-                       f"Recall@{TOPK}":"Recall_mean"})
+    lf.group_by(["mode","alpha","pool"])
+      .agg([pl.col(f"MRR@{TOPK}").mean().alias("MRR_mean"),
+            pl.col(f"nDCG@{TOPK}").mean().alias("nDCG_mean"),
+            pl.col(f"Recall@{TOPK}").mean().alias("Recall_mean")])
+      # Rank: prioritize MRR, then nDCG, then Recall
+      .sort(["MRR_mean","nDCG_mean","Recall_mean"], descending=True)
+      .collect(streaming=True)
 )
 
-# Rank: prioritize MRR, then nDCG, then Recall
-summary = summary.sort_values(["MRR_mean","nDCG_mean","Recall_mean"], ascending=False)
 print(summary.head(10))
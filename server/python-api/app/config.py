@@ -25,9 +25,36 @@ FINAL_TOPK   = int(os.getenv("FINAL_TOPK", "5"))
 THRESHOLD    = float(os.getenv("THRESHOLD", "0"))
 COSINE_FLOOR = float(os.getenv("COSINE_FLOOR", "0.0"))
 
+# engines the API builds at startup instead of on first request: "jd_col:cv_col,jd_col:cv_col"
+PREBUILD_COLS = os.getenv("PREBUILD_COLS", "")
+
+# built engines kept in memory (LRU); each holds its own encoder, BM25 matrix and index
+ENGINE_CACHE_SIZE = int(os.getenv("ENGINE_CACHE_SIZE", "8"))
+
+# per-engine memo of query embeddings / tokens / branch scores (entries per cache)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+
+# ANN index over CV embeddings (HNSW for small corpora, OPQ+IVF-HNSW+PQ above HNSW_MAX_N)
+HNSW_MAX_N      = int(os.getenv("HNSW_MAX_N", "5000"))
+HNSW_EF_SEARCH  = int(os.getenv("HNSW_EF_SEARCH", "128"))
+IVF_NPROBE      = int(os.getenv("IVF_NPROBE", "16"))
+FAISS_THREADS   = int(os.getenv("FAISS_THREADS", str(os.cpu_count() or 1)))   # OpenMP fan-out for batched searches
+
+# built engine state (BM25 matrix, CV vectors, FAISS index) is persisted here, keyed by a data/model signature
+ENGINE_CACHE_DIR = os.getenv("ENGINE_CACHE_DIR", "~/.cache/match_engine")
+
 # models
 ENCODER_ID   = os.getenv("ENCODER_ID", "BAAI/bge-m3")
 CE_MODEL_ID  = os.getenv("CE_MODEL_ID", "BAAI/bge-reranker-base")
+CE_MULTI_GPU = os.getenv("CE_MULTI_GPU", "pool")   # >1 GPU: pool (process per GPU, reranker_mp) | dataparallel (nn.DataParallel in-process)
+CE_BACKEND   = os.getenv("CE_BACKEND", "torch")   # cross-encoder runtime: "torch" (CrossEncoder) | "ort" (ONNX Runtime via optimum)
+CE_QUANTIZE  = os.getenv("CE_QUANTIZE", "0") == "1"   # int8 dynamic quantization of the torch CE's Linear layers on CPU (opt-in)
+
+# encoder runtime: "torch" (SentenceTransformer) | "onnx" (ONNX Runtime via optimum, int8 on CPU)
+ENCODER_BACKEND = os.getenv("ENCODER_BACKEND", "torch")
+ONNX_CACHE_DIR  = os.getenv("ONNX_CACHE_DIR", "~/.cache/cv_jd_matching/onnx")
 
 # device
 USE_CUDA     = os.getenv("USE_CUDA", "auto")   # auto | cpu | cuda
+TORCH_THREADS = int(os.getenv("TORCH_THREADS", str(os.cpu_count() or 1)))   # intra-op threads on CPU
+TORCH_COMPILE = os.getenv("TORCH_COMPILE", "0") == "1"   # torch.compile the torch encoder (opt-in)
@@ -0,0 +1,145 @@
+# app/encoder.py
+import json
+import os
+import re
+from typing import List
+
+import numpy as np
+import torch
+from sentence_transformers import SentenceTransformer
+
+from .config import ENCODER_BACKEND, ONNX_CACHE_DIR, TORCH_COMPILE
+
+
+def _pooling_mode(model_id: str) -> str:
+    """Read the pooling used by the SentenceTransformer checkpoint ("cls" for BGE models, else "mean")."""
+    if os.path.isdir(model_id):
+        path = os.path.join(model_id, "1_Pooling", "config.json")
+    else:
+        from huggingface_hub import hf_hub_download
+        try:
+            path = hf_hub_download(model_id, "1_Pooling/config.json")
+        except Exception:
+            return "mean"
+    if not os.path.exists(path):
+        return "mean"
+    with open(path) as f:
+        cfg = json.load(f)
+    return "cls" if cfg.get("pooling_mode_cls_token") else "mean"
+
+
+class OnnxEncoder:
+    """ONNX Runtime stand-in for the subset of SentenceTransformer.encode the engine uses.
+
+    The model is exported once to ONNX_CACHE_DIR (and dynamically quantized to int8 for CPU);
+    later loads reuse the cached graph.
+    """
+
+    def __init__(self, model_id: str, device: str):
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForFeatureExtraction, ORTQuantizer
+        from optimum.onnxruntime.configuration import AutoQuantizationConfig
+        from transformers import AutoTokenizer
+
+        out_dir = os.path.join(os.path.expanduser(ONNX_CACHE_DIR), re.sub(r"[^\w.-]+", "_", model_id))
+        if not os.path.exists(os.path.join(out_dir, "model.onnx")):
+            ORTModelForFeatureExtraction.from_pretrained(model_id, export=True).save_pretrained(out_dir)
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(out_dir)
+
+        file_name = "model.onnx"
+        if device != "cuda":
+            file_name = "model_quantized.onnx"
+            if not os.path.exists(os.path.join(out_dir, file_name)):
+                quantizer = ORTQuantizer.from_pretrained(out_dir, file_name="model.onnx")
+                quantizer.quantize(save_dir=out_dir, quantization_config=AutoQuantizationConfig.avx2(is_static=False))
+
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        opts.intra_op_num_threads = os.cpu_count() or 1
+        self.model = ORTModelForFeatureExtraction.from_pretrained(
+            out_dir,
+            file_name=file_name,
+            provider="CUDAExecutionProvider" if device == "cuda" else "CPUExecutionProvider",
+            session_options=opts,
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(out_dir)
+        self.pooling = _pooling_mode(model_id)
+        self.max_seq_length = 512
+
+    def encode(
+        self,
+        sentences: List[str],
+        batch_size: int = 32,
+        convert_to_numpy: bool = True,
+        normalize_embeddings: bool = False,
+        show_progress_bar: bool = False,
+    ) -> np.ndarray:
+        out = []
+        for i in range(0, len(sentences), batch_size):
+            feats = self.tokenizer(
+                list(sentences[i:i+batch_size]), padding=True, truncation=True,
+                max_length=self.max_seq_length, return_tensors="np",
+            )
+            hidden = np.asarray(self.model(**feats).last_hidden_state, dtype=np.float32)
+            if self.pooling == "cls":
+                emb = hidden[:, 0]
+            else:
+                mask = feats["attention_mask"][..., None].astype(np.float32)
+                emb = (hidden * mask).sum(1) / np.clip(mask.sum(1), 1e-9, None)
+            if normalize_embeddings:
+                emb = emb / np.clip(np.linalg.norm(emb, axis=1, keepdims=True), 1e-12, None)
+            out.append(emb)
+        return np.vstack(out) if out else np.zeros((0, 0), dtype=np.float32)
+
+
+def amp_dtype() -> torch.dtype:
+    """bf16 autocast where the GPU supports it (Ampere+), else fp16."""
+    return torch.bfloat16 if torch.cuda.is_available() and torch.cuda.is_bf16_supported() else torch.float16
+
+# token-length bucket upper edges; batches never mix buckets
+LENGTH_BUCKETS = (16, 32, 64, 128, 256)
+
+def encode_bucketed(model, texts: List[str], device: str, batch_size: int = 32) -> np.ndarray:
+    """Encode `texts` (L2-normalized, float32) batching only within token-length buckets.
+
+    Rows are returned in input order.
+    """
+    if not texts:
+        return np.zeros((0, 0), dtype=np.float32)
+    lens = np.asarray(model.tokenizer(
+        list(texts), add_special_tokens=True, truncation=True,
+        max_length=model.max_seq_length, return_length=True,
+    )["length"])
+    bucket = np.digitize(lens, LENGTH_BUCKETS, right=True)
+    order = np.lexsort((lens, bucket))
+
+    out = None
+    with torch.inference_mode():
+        for b in np.unique(bucket):
+            members = order[bucket[order] == b]
+            for i in range(0, len(members), batch_size):
+                idx = members[i:i+batch_size]
+                with torch.amp.autocast("cuda", dtype=amp_dtype(), enabled=(device == "cuda")):
+                    embs = model.encode(
+                        [texts[j] for j in idx],
+                        batch_size=len(idx),
+                        convert_to_numpy=True,
+                        normalize_embeddings=True,
+                        show_progress_bar=False,
+                    )
+                if out is None:
+                    out = np.empty((len(texts), embs.shape[1]), dtype=np.float32)
+                out[idx] = embs
+    return out
+
+
+def load_encoder(model_id: str, device: str):
+    if ENCODER_BACKEND == "onnx":
+        return OnnxEncoder(model_id, device)
+    model = SentenceTransformer(model_id, device=device)
+    if TORCH_COMPILE and hasattr(torch, "compile"):
+        try:
+            model[0].auto_model = torch.compile(model[0].auto_model, mode="reduce-overhead", dynamic=True)
+        except Exception as e:   # older torch / unsupported backend: stay eager
+            print(f"[encoder] torch.compile unavailable, running eager: {e}")
+    return model
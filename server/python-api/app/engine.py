@@ -1,32 +1,52 @@
 # app/engine.py
+import hashlib
+import json
 import os
 import re
+import threading
 import unicodedata
 from typing import List, Dict, Any, Optional, Tuple
 
 import faiss
 import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 import torch
-from rank_bm25 import BM25Okapi
-from sentence_transformers import SentenceTransformer
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+from tokenizers import Tokenizer, Regex, pre_tokenizers
+from tokenizers.models import WordLevel
 
 # you can still keep paths/models in config; columns will NOT come from it
 from .config import (
     JD_PATH, CV_PATH, JD_FMT, CV_FMT,
     ENCODER_ID, RRF_K, POOL, USE_CUDA,
+    TORCH_THREADS,
+    HNSW_MAX_N, HNSW_EF_SEARCH, IVF_NPROBE, FAISS_THREADS, ENGINE_CACHE_DIR, QUERY_CACHE_SIZE,
+    ENGINE_CACHE_SIZE,
+    ENCODER_BACKEND,
     CV_ID_COL, JD_ID_COL,         # optional id columns to include if present
 )
+from .encoder import load_encoder, encode_bucketed, amp_dtype
 
 os.environ["HF_HUB_DISABLE_PROGRESS_BARS"] = "1"
-os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True"
+os.environ["PYTORCH_CUDA_ALLOC_CONF"] = "expandable_segments:True,garbage_collection_threshold:0.8"
 
 device = (
     "cuda" if (USE_CUDA == "cuda" or (USE_CUDA == "auto" and torch.cuda.is_available()))
     else "cpu"
 )
 
+if device == "cpu":
+    torch.set_num_threads(TORCH_THREADS)
+    try:
+        torch.set_num_interop_threads(2)
+    except RuntimeError:
+        pass  # can only be set before the first parallel op
+else:
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+
 # ---------- utils ----------
 def _load(path, fmt):
     if fmt.lower() == "csv":
@@ -35,29 +55,179 @@ def _load(path, fmt):
         return pd.read_parquet(path)
     raise ValueError("Unsupported format")
 
+def _used_extras(cv_col: str, extra_cv_cols: Optional[Dict[str, str]], cv_columns) -> Dict[str, str]:
+    """The extra_cv_cols entries MatchEngine actually reads: "summary" off the unique-CV view, "clean" off the CV table."""
+    extra = extra_cv_cols or {}
+    unique_cols = {cv_col, "cv_uid"} | ({CV_ID_COL} if CV_ID_COL in cv_columns else set())
+    used = {}
+    if extra.get("summary") in unique_cols:
+        used["summary"] = extra["summary"]
+    if extra.get("clean") is not None and extra["clean"] in cv_columns:
+        used["clean"] = extra["clean"]
+    return used
+
 _keep = set("#+./_-%")
+_TOK_SPLIT = rf"[^\w{re.escape(''.join(sorted(_keep)))}]+"
+
+# word splitting runs in Rust; the placeholder vocab is never read, only the split offsets are
+_pretok = Tokenizer(WordLevel({"[UNK]": 0}, unk_token="[UNK]"))
+_pretok.pre_tokenizer = pre_tokenizers.Split(Regex(_TOK_SPLIT), behavior="removed")
+
+_STOP = frozenset(ENGLISH_STOP_WORDS)
+
+def _tok_batch(texts: List[str]) -> List[List[str]]:
+    nfkc, stop = unicodedata.normalize, _STOP   # locals: avoid global lookups in the per-token loop
+    norm = [nfkc("NFKC", str(s).lower()) for s in texts]
+    encs = _pretok.encode_batch(norm, add_special_tokens=False)
+    return [
+        [w for w in (t[a:b] for a, b in e.offsets) if len(w) > 1 and w not in stop]
+        for t, e in zip(norm, encs)
+    ]
+
 def _tok(s: str):
-    s = unicodedata.normalize("NFKC", str(s).lower())
-    s = re.sub(rf"[^\w{re.escape(''.join(_keep))}\s]+", " ", s)
-    s = re.sub(r"\s+", " ", s).strip()
-    return [w for w in s.split() if w not in ENGLISH_STOP_WORDS and len(w) > 1]
+    return _tok_batch([s])[0]
+
+_IVF_FACTORY = "OPQ64,IVF256_HNSW32,PQ64"
+# index recipe tag in the cache signature: bump when _build_index changes beyond _IVF_FACTORY
+_INDEX_FORMAT = f"1|hnsw_sq8:M32,efC200|opq_ivf_pq64:{_IVF_FACTORY}"
+
+def _index_kind(n: int) -> str:
+    return "hnsw_sq8" if n < HNSW_MAX_N else "opq_ivf_pq64"
+
+def _engine_cache_dir(cv_col: str) -> str:
+    """Per-(data, model, column, index recipe) cache dir; any change to the CV file, encoder or index build yields a new signature."""
+    cv_path = os.path.abspath(os.path.expanduser(CV_PATH))
+    st = os.stat(cv_path)
+    sig = hashlib.sha1(
+        f"{ENCODER_ID}|{ENCODER_BACKEND}|{cv_col}|{cv_path}|{st.st_mtime_ns}|{st.st_size}"
+        f"|{HNSW_MAX_N}|{_INDEX_FORMAT}".encode()
+    ).hexdigest()[:12]
+    return os.path.join(os.path.expanduser(ENGINE_CACHE_DIR), sig)
+
+def _build_index(vecs: np.ndarray) -> "faiss.Index":
+    n, d = vecs.shape
+    if _index_kind(n) == "hnsw_sq8":
+        # 8-bit scalar-quantized storage: 4x smaller than float32, plenty for RRF ranking
+        index = faiss.IndexHNSWSQ(d, faiss.ScalarQuantizer.QT_8bit, 32, faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = 200
+    else:
+        index = faiss.index_factory(d, _IVF_FACTORY, faiss.METRIC_INNER_PRODUCT)
+    index.train(vecs)
+    index.add(vecs)
+    return index
+
+def _set_search_params(index) -> None:
+    if isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = HNSW_EF_SEARCH
+    else:
+        faiss.ParameterSpace().set_index_parameter(index, "nprobe", IVF_NPROBE)
+
+# ---------- BM25 (Okapi, same scoring as rank_bm25.BM25Okapi) ----------
+class _BM25Index:
+    """Precomputed V x N CSR matrix of per-(term, doc) BM25 weights; a query is one sparse matvec."""
+    def __init__(self, corpus_tokens: List[List[str]], k1: float = 1.5, b: float = 0.75, epsilon: float = 0.25):
+        self.N = len(corpus_tokens)
+        self.vocab: Dict[str, int] = {}
+        per_term: List[Dict[int, int]] = []
+        doc_len = np.zeros(self.N, dtype=np.float32)
+        for d, toks in enumerate(corpus_tokens):
+            doc_len[d] = len(toks)
+            for w in toks:
+                t = self.vocab.setdefault(w, len(self.vocab))
+                if t == len(per_term):
+                    per_term.append({})
+                per_term[t][d] = per_term[t].get(d, 0) + 1
+        avgdl = float(doc_len.sum()) / max(self.N, 1)
+
+        # postings in CSR layout: term t owns [indptr[t], indptr[t+1])
+        df = np.fromiter((len(p) for p in per_term), dtype=np.int64, count=len(per_term))
+        nnz = int(df.sum())
+        indptr = np.zeros(len(per_term) + 1, dtype=np.int64)
+        np.cumsum(df, out=indptr[1:])
+        docs = np.fromiter((d for p in per_term for d in p), dtype=np.int32, count=nnz)
+        tf = np.fromiter((f for p in per_term for f in p.values()), dtype=np.float32, count=nnz)
+
+        # Okapi idf; negative idfs are floored to epsilon * mean idf like rank_bm25
+        idf = np.log(self.N - df + 0.5) - np.log(df + 0.5)
+        eps = epsilon * (idf.sum() / len(idf)) if len(idf) else 0.0
+        idf[idf < 0] = eps
+
+        norm = k1 * (1.0 - b + b * doc_len / avgdl) if avgdl > 0 else np.full(self.N, k1, dtype=np.float32)
+        data = np.repeat(idf, df).astype(np.float32) * tf * (k1 + 1.0) / (tf + norm[docs])
+        self.weights = sp.csr_matrix((data, docs, indptr), shape=(len(per_term), self.N))
+
+    def get_scores(self, query_tokens: List[str]) -> np.ndarray:
+        ids = [self.vocab[w] for w in query_tokens if w in self.vocab]
+        if not ids:
+            return np.zeros(self.N, dtype=np.float32)
+        # repeated query terms count once per occurrence, as in BM25Okapi
+        terms, counts = np.unique(np.asarray(ids, dtype=np.int64), return_counts=True)
+        return counts.astype(np.float32) @ self.weights[terms]
+
+    def save(self, cache_dir: str) -> None:
+        sp.save_npz(os.path.join(cache_dir, "bm25_weights.npz"), self.weights)
+        with open(os.path.join(cache_dir, "bm25_vocab.json"), "w") as f:
+            json.dump(self.vocab, f)
+
+    @classmethod
+    def load(cls, cache_dir: str) -> "_BM25Index":
+        self = cls.__new__(cls)
+        self.weights = sp.load_npz(os.path.join(cache_dir, "bm25_weights.npz")).tocsr()
+        with open(os.path.join(cache_dir, "bm25_vocab.json")) as f:
+            self.vocab = json.load(f)
+        self.N = self.weights.shape[1]
+        return self
+
+    def get_scores_batch(self, queries_tokens: List[List[str]]) -> np.ndarray:
+        """(n_queries, N) scores: one (n x V) query-count CSR times the weight matrix."""
+        rows = [[self.vocab[w] for w in toks if w in self.vocab] for toks in queries_tokens]
+        indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+        np.cumsum([len(r) for r in rows], out=indptr[1:])
+        cols = np.fromiter((t for r in rows for t in r), dtype=np.int64, count=int(indptr[-1]))
+        q = sp.csr_matrix((np.ones(len(cols), dtype=np.float32), cols, indptr), shape=(len(rows), self.weights.shape[0]))
+        q.sum_duplicates()
+        return (q @ self.weights).toarray()
+
+def _memo(cache: Dict, key, fn):
+    if key in cache:
+        return cache[key]
+    if len(cache) >= QUERY_CACHE_SIZE:
+        try:
+            cache.pop(next(iter(cache)), None)   # drop oldest entry
+        except (StopIteration, RuntimeError):    # concurrent retrieve() threads resized the dict
+            pass
+    cache[key] = val = fn()
+    return val
+
+def topk_desc(a: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest entries of `a`, best first: O(N + k log k) instead of a full argsort."""
+    k = min(int(k), len(a))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    part = np.argpartition(a, len(a) - k)[len(a) - k:]
+    return part[np.argsort(-a[part], kind="stable")]
 
 def _normalize_0_100(a):
     a = np.asarray(a, dtype=float)
     if a.size == 0: return a
     lo, hi = a.min(), a.max()
     if hi <= lo: return np.full_like(a, 100.0)
-    return 100.0 * (a - lo) / (hi - lo)
+    out = np.subtract(a, lo)  # one allocation, scaled in place
+    return np.multiply(out, 100.0 / (hi - lo), out=out)
 
 def _rrf_tie_sorted(b_idx, b_sc, e_idx, e_sc, rrf_k=60):
-    b_map = {int(d): float(s) for d, s in zip(b_idx, b_sc)}
-    e_map = {int(d): float(s) for d, s in zip(e_idx, e_sc)}
-    ranks = {}
-    for r, d in enumerate(b_idx, 1): ranks[int(d)] = ranks.get(int(d), 0.0) + 1.0/(rrf_k+r)
-    for r, d in enumerate(e_idx, 1): ranks[int(d)] = ranks.get(int(d), 0.0) + 1.0/(rrf_k+r)
-    rows = [(doc, rrf_s, e_map.get(doc, -1e9), b_map.get(doc, -1e9)) for doc, rrf_s in ranks.items()]
-    rows.sort(key=lambda x: (x[1], x[2], x[3]), reverse=True)
-    return rows  # (cv_uid, rrf_score, emb_score, bm25_score)
+    b_idx, e_idx = np.asarray(b_idx, dtype=np.int64), np.asarray(e_idx, dtype=np.int64)
+    ids = np.union1d(b_idx, e_idx)
+    b_pos, e_pos = np.searchsorted(ids, b_idx), np.searchsorted(ids, e_idx)
+
+    rrf = np.zeros(len(ids), dtype=float)
+    np.add.at(rrf, b_pos, 1.0 / (rrf_k + 1.0 + np.arange(len(b_idx))))
+    np.add.at(rrf, e_pos, 1.0 / (rrf_k + 1.0 + np.arange(len(e_idx))))
+    b_map = np.full(len(ids), -1e9); b_map[b_pos] = b_sc
+    e_map = np.full(len(ids), -1e9); e_map[e_pos] = e_sc
+
+    order = np.lexsort((b_map, e_map, rrf))[::-1]   # rrf desc, then emb, then bm25
+    return ids[order], rrf[order], e_map[order], b_map[order]  # (cv_uid, rrf_score, emb_score, bm25_score)
 
 # ========== Dynamic Engine keyed by (jd_col, cv_col) ==========
 class MatchEngine:
@@ -75,7 +245,7 @@ class MatchEngine:
         # columns chosen dynamically
         self.jd_col = jd_col
         self.cv_col = cv_col
-        self.extra_cv_cols = extra_cv_cols or {}
+        self.extra_cv_cols = _used_extras(cv_col, extra_cv_cols, self.cv.columns)
 
         assert self.jd_col in self.jd.columns, f"Missing JD column: {self.jd_col}"
         assert self.cv_col in self.cv.columns, f"Missing CV column: {self.cv_col}"
@@ -111,54 +281,132 @@ class MatchEngine:
         else:
             self.cv_members = {i: [i] for i in range(self.N_UNIQ)}
 
-        # BM25 over selected CV column
-        corpus_tokens = [_tok(t) for t in cv_unique[self.cv_col].astype(str).tolist()]
-        self.bm25 = BM25Okapi(corpus_tokens)
-
-        # encoder + FAISS over selected CV column
-        self.model = SentenceTransformer(ENCODER_ID, device=device)
+        # plain per-uid lists for the retrieve() output loop (no pandas lookups per row)
+        self.cv_texts: List[str] = cv_unique[self.cv_col].astype(str).tolist()
+        self.cv_ids: Optional[np.ndarray] = (
+            cv_unique[CV_ID_COL].to_numpy() if CV_ID_COL in cv_unique.columns else None
+        )
+        summary_col = self.extra_cv_cols.get("summary")
+        self.cv_summaries: Optional[List[str]] = (
+            cv_unique[summary_col].astype(str).tolist() if summary_col and summary_col in cv_unique.columns else None
+        )
+        # longest member text in the "clean" extra column, per uid
+        self.cv_clean_full: Optional[List[Optional[str]]] = None
+        clean_col = self.extra_cv_cols.get("clean")
+        if clean_col and clean_col in self.cv.columns:
+            clean = self.cv[clean_col].astype(str).tolist()
+            self.cv_clean_full = [
+                max((clean[r] for r in self.cv_members.get(uid, [])), key=len, default=None)
+                for uid in range(self.N_UNIQ)
+            ]
+
+        # encoder (always needed for queries)
+        self.model = load_encoder(ENCODER_ID, device)
         self.model.max_seq_length = 256
 
-        BATCH = 8 if device == "cuda" else 64
-        vecs = []
-        with torch.inference_mode():
-            for i in range(0, len(cv_unique), BATCH):
-                chunk = cv_unique[self.cv_col].astype(str).iloc[i:i+BATCH].tolist()
-                with torch.amp.autocast("cuda", enabled=(device == "cuda")):
-                    embs = self.model.encode(
-                        chunk,
-                        batch_size=len(chunk),
-                        convert_to_numpy=True,
-                        normalize_embeddings=True,
-                        show_progress_bar=False,
-                    )
-                vecs.append(embs.astype("float32"))
-                if device == "cuda":
-                    torch.cuda.empty_cache()
-        self.cv_vecs = np.vstack(vecs)
-        emb_dim = self.cv_vecs.shape[1]
-        self.index = faiss.IndexFlatIP(emb_dim)
-        self.index.add(self.cv_vecs)
+        # BM25 + CV vectors + FAISS index: reuse the persisted build when the signature matches
+        cache_dir = _engine_cache_dir(self.cv_col)
+        if os.path.exists(os.path.join(cache_dir, "DONE")):
+            self.bm25 = _BM25Index.load(cache_dir)
+            self.cv_vecs = np.load(os.path.join(cache_dir, "cv_vecs.npy"), mmap_mode="r")
+            self.index = faiss.read_index(os.path.join(cache_dir, "faiss.idx"), faiss.IO_FLAG_MMAP)
+        else:
+            # BM25 over selected CV column
+            self.bm25 = _BM25Index(_tok_batch(self.cv_texts))
+
+            # bucket-batch by token length so batches carry little padding
+            cv_vecs = encode_bucketed(self.model, self.cv_texts, device, batch_size=32 if device == "cuda" else 64)
+            if device == "cuda":
+                torch.cuda.empty_cache()   # once, after the corpus pass; query-time encodes stay small
+            self.index = _build_index(cv_vecs)
+            # only the cosine floor reads raw vectors; fp16 halves their footprint
+            self.cv_vecs = cv_vecs.astype(np.float16)
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+                self.bm25.save(cache_dir)
+                np.save(os.path.join(cache_dir, "cv_vecs.npy"), self.cv_vecs)
+                faiss.write_index(self.index, os.path.join(cache_dir, "faiss.idx"))
+                open(os.path.join(cache_dir, "DONE"), "w").close()   # written last: marks a complete cache
+            except (OSError, RuntimeError) as e:   # faiss raises RuntimeError on IO errors
+                print(f"[engine] could not persist engine cache to {cache_dir}: {e}")
+        _set_search_params(self.index)
+        faiss.omp_set_num_threads(FAISS_THREADS)
+
+        # query-side memos; the eval grid re-queries the same JD text many times
+        self._qv_cache: Dict[str, np.ndarray] = {}
+        self._qtok_cache: Dict[str, List[str]] = {}
+        self._branch_cache: Dict[str, Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._resolve_maps: Dict[str, Dict[str, str]] = {}
 
         # helpful debug
         self.built_jd_col = self.jd_col
         self.built_cv_col = self.cv_col
 
+    def resolve_map(self, target_col: str) -> Dict[str, str]:
+        """jd_col value -> longest target_col value among JD rows sharing it; built on first use per column."""
+        m = self._resolve_maps.get(target_col)
+        if m is None:
+            m = self._resolve_maps[target_col] = (
+                self.jd[target_col].astype(str)
+                .groupby(self.jd[self.jd_col].astype(str), sort=False)
+                .agg(lambda s: max(s, key=len))
+                .to_dict())
+        return m
+
+    def _encode_query(self, text: str) -> np.ndarray:
+        def enc():
+            with torch.inference_mode():
+                with torch.amp.autocast("cuda", dtype=amp_dtype(), enabled=(device=="cuda")):
+                    return self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False).astype("float32")
+        return _memo(self._qv_cache, text, enc)
+
     # public APIs
     def emb_scores(self, text: str, topk: int = 2000):
         topk = min(topk, self.N_UNIQ)
-        with torch.inference_mode():
-            with torch.amp.autocast("cuda", enabled=(device=="cuda")):
-                qv = self.model.encode([text], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False).astype("float32")
+        qv = self._encode_query(text)
         sims, idx = self.index.search(qv, topk)
-        return idx[0], sims[0]
+        found = idx[0] >= 0   # ANN search may return fewer than topk hits
+        return idx[0][found], sims[0][found]
 
     def bm25_scores(self, text: str, topk: int = 2000):
         topk = min(topk, self.N_UNIQ)
-        sc = self.bm25.get_scores(_tok(text))
-        idx = np.argsort(sc)[-topk:][::-1]
+        sc = self.bm25.get_scores(_memo(self._qtok_cache, text, lambda: _tok(text)))
+        idx = topk_desc(sc, topk)
         return idx, sc[idx]
 
+    def emb_scores_batch(self, texts: List[str], topk: int = 2000):
+        """Like emb_scores for many queries: one bucketed encode pass and one FAISS search."""
+        Q = encode_bucketed(self.model, list(texts), device, batch_size=32 if device == "cuda" else 64)
+        return Q, self.search_batch(Q, topk)
+
+    def search_batch(self, qvs: np.ndarray, topk: int = 2000):
+        """FAISS search for a matrix of already-encoded queries; OpenMP parallelizes across rows."""
+        sims, idx = self.index.search(np.ascontiguousarray(qvs, dtype=np.float32), min(topk, self.N_UNIQ))
+        return [(i[i >= 0], s[i >= 0]) for i, s in zip(idx, sims)]
+
+    def bm25_scores_batch(self, texts_tokens: List[List[str]], topk: int = 2000):
+        """Like bm25_scores for many already-tokenized queries: one sparse matmul."""
+        S = self.bm25.get_scores_batch(texts_tokens)
+        out = []
+        for sc in S:
+            idx = topk_desc(sc, topk)
+            out.append((idx, sc[idx]))
+        return out
+
+    def prefetch(self, texts: List[str]) -> None:
+        """Batch-compute and memoize embeddings, tokens and branch scores for many query texts,
+        so later retrieve() calls on them only do fusion."""
+        texts = [t for t in dict.fromkeys(map(str, texts)) if t not in self._branch_cache]
+        if not texts:
+            return
+        toks = _tok_batch(texts)
+        Q, emb = self.emb_scores_batch(texts)
+        bm25 = self.bm25_scores_batch(toks)
+        for i, t in enumerate(texts):
+            _memo(self._qtok_cache, t, lambda i=i: toks[i])
+            _memo(self._qv_cache, t, lambda i=i: Q[i:i+1])
+            _memo(self._branch_cache, t, lambda i=i: (*bm25[i], *emb[i]))
+
     def retrieve(
         self,
         jd_text: str,
@@ -167,25 +415,28 @@ class MatchEngine:
         rrf_k: int = RRF_K,
         threshold: Optional[float] = None,
         cosine_floor: float = 0.0,
+        return_arrays: bool = False,
     ):
-        # branch scores
-        b_idx, b_sc = self.bm25_scores(jd_text)
-        e_idx, e_sc = self.emb_scores(jd_text)
+        """
+        Top-k candidates as dicts, best first.
+        return_arrays: also return {"hybrid_0_100": float64[k], "cv_uid": int64[k]} aligned with the dicts.
+        """
+        # branch scores (independent of pool/rrf_k/threshold, so memoized per JD text)
+        b_idx, b_sc, e_idx, e_sc = _memo(
+            self._branch_cache, jd_text,
+            lambda: (*self.bm25_scores(jd_text), *self.emb_scores(jd_text)),
+        )
 
         # fuse + pool
-        rows = _rrf_tie_sorted(b_idx, b_sc, e_idx, e_sc, rrf_k=rrf_k)
-        rows = rows[:min(pool, len(rows), self.N_UNIQ)]
-
-        cvu  = [d for d, *_ in rows]
-        rrf  = np.array([s for _, s, *_ in rows], dtype=float)
+        cvu, rrf, _, _ = _rrf_tie_sorted(b_idx, b_sc, e_idx, e_sc, rrf_k=rrf_k)
+        n = min(pool, len(cvu), self.N_UNIQ)
+        cvu, rrf = cvu[:n], rrf[:n]
         norm = _normalize_0_100(rrf)
 
         # optional cosine floor
         if cosine_floor > 0.0:
-            with torch.inference_mode():
-                with torch.amp.autocast("cuda", enabled=(device=="cuda")):
-                    qv = self.model.encode([jd_text], convert_to_numpy=True, normalize_embeddings=True, show_progress_bar=False).astype("float32")[0]
-            cos = np.array([float(np.dot(qv, self.cv_vecs[u])) for u in cvu], dtype=float)
+            qv = self._encode_query(jd_text)[0]
+            cos = (self.cv_vecs[cvu].astype(np.float32) @ qv).astype(float)   # one GEMV; rows are unit-norm
         else:
             cos = np.ones_like(norm)
 
@@ -195,45 +446,49 @@ class MatchEngine:
         if cosine_floor > 0.0:
             keep &= (cos >= float(cosine_floor))
 
-        cvu, rrf, norm = np.array(cvu)[keep], rrf[keep], norm[keep]
+        cvu, rrf, norm = cvu[keep], rrf[keep], norm[keep]
         cvu, rrf, norm = cvu[:k], rrf[:k], norm[:k]
 
-        # package output
-        def pick_full(uid: int):
-            rows = self.cv_members.get(int(uid), [])
-            # if user provided a "clean" column name in extra_cv_cols, use it; else None
-            clean_col = self.extra_cv_cols.get("clean")
-            if not rows or not clean_col or clean_col not in self.cv.columns:
-                return None
-            subset = self.cv.loc[rows, clean_col].astype(str)
-            return subset.iloc[subset.str.len().argmax()] if not subset.empty else None
-
         # we expose:
         # - cv_text: the EXACT column used for retrieval/embeddings (self.cv_col)
         # - cv_summary: optional (if user provided a "summary" extra column and it exists)
-        # - clean_cv_full: optional (as above)
+        # - clean_cv_full: optional (longest member row of the "clean" extra column)
         out = []
-        for uid, s, s100 in zip(cvu, rrf, norm):
+        for uid, s, s100 in zip(cvu.tolist(), rrf.tolist(), norm.tolist()):
             row = {
-                "cv_uid": int(uid),
-                "hybrid_score": float(s),
-                "hybrid_score_0_100": float(s100),
-                "cv_text": str(self.cv_unique.at[int(uid), self.cv_col]),
+                "cv_uid": uid,
+                "hybrid_score": s,
+                "hybrid_score_0_100": s100,
+                "cv_text": self.cv_texts[uid],
             }
-            summary_col = self.extra_cv_cols.get("summary")
-            if summary_col and summary_col in self.cv_unique.columns:
-                row["cv_summary"] = str(self.cv_unique.at[int(uid), summary_col])
-            clean_full = pick_full(int(uid))
-            if clean_full is not None:
-                row["clean_cv_full"] = clean_full
-            if CV_ID_COL in self.cv_unique.columns:
-                row["cv_id"] = int(self.cv_unique.at[int(uid), CV_ID_COL])
+            if self.cv_summaries is not None:
+                row["cv_summary"] = self.cv_summaries[uid]
+            if self.cv_clean_full is not None and self.cv_clean_full[uid] is not None:
+                row["clean_cv_full"] = self.cv_clean_full[uid]
+            if self.cv_ids is not None:
+                row["cv_id"] = int(self.cv_ids[uid])
             out.append(row)
+        if return_arrays:
+            return out, {"hybrid_0_100": norm, "cv_uid": cvu.astype(np.int64, copy=False)}
         return out
 
 
-# --------- engine cache keyed by (jd_col, cv_col) ----------
-_ENGINE_CACHE: Dict[Tuple[str, str], MatchEngine] = {}
+# --------- engine cache keyed by (jd_col, cv_col, extra_cv_cols), LRU-bounded ----------
+_ENGINE_CACHE: Dict[Tuple[str, str, frozenset], MatchEngine] = {}   # insertion order = recency
+_ENGINE_LOCK = threading.Lock()   # guards _ENGINE_CACHE
+_BUILD_LOCK = threading.Lock()    # sync endpoints run on a threadpool: concurrent first requests build once
+_CV_COLUMNS: Optional[frozenset] = None
+
+def _cv_columns() -> frozenset:
+    """Column names of the CV file, read from its header/schema once."""
+    global _CV_COLUMNS
+    if _CV_COLUMNS is None:
+        if CV_FMT.lower() == "parquet":
+            import pyarrow.parquet as pq
+            _CV_COLUMNS = frozenset(pq.read_schema(os.path.expanduser(CV_PATH)).names)
+        else:
+            _CV_COLUMNS = frozenset(pd.read_csv(CV_PATH, nrows=0).columns)
+    return _CV_COLUMNS
 
 def get_engine(
     *,
@@ -242,7 +497,28 @@ def get_engine(
     extra_cv_cols: Optional[Dict[str, str]] = None,
     force_rebuild: bool = False,
 ) -> MatchEngine:
-    key = (jd_col, cv_col)
-    if force_rebuild or key not in _ENGINE_CACHE:
-        _ENGINE_CACHE[key] = MatchEngine(jd_col=jd_col, cv_col=cv_col, extra_cv_cols=extra_cv_cols)
-    return _ENGINE_CACHE[key]
+    # key on the extras the engine would use, so unknown keys / absent columns share one engine
+    extras = _used_extras(cv_col, extra_cv_cols, _cv_columns())
+    key = (jd_col, cv_col, frozenset(extras.items()))
+    with _ENGINE_LOCK:
+        eng = None if force_rebuild else _ENGINE_CACHE.pop(key, None)
+        if eng is not None:
+            _ENGINE_CACHE[key] = eng   # re-insert as most recent
+            return eng
+    with _BUILD_LOCK:   # one build at a time; hits on built engines don't wait for it
+        with _ENGINE_LOCK:
+            eng = None if force_rebuild else _ENGINE_CACHE.get(key)
+        if eng is None:
+            eng = MatchEngine(jd_col=jd_col, cv_col=cv_col, extra_cv_cols=extras)
+        with _ENGINE_LOCK:
+            _ENGINE_CACHE.pop(key, None)
+            _ENGINE_CACHE[key] = eng
+            while len(_ENGINE_CACHE) > max(ENGINE_CACHE_SIZE, 1):
+                _ENGINE_CACHE.pop(next(iter(_ENGINE_CACHE)))   # evict least recently used
+    return eng
+
+def prebuild_engines(spec: str, extra_cv_cols: Optional[Dict[str, str]] = None) -> None:
+    """Build engines for a "jd_col:cv_col,..." spec (config.PREBUILD_COLS) ahead of the first request."""
+    for item in filter(None, (s.strip() for s in spec.split(","))):
+        jd_col, cv_col = (c.strip() for c in item.split(":", 1))
+        get_engine(jd_col=jd_col, cv_col=cv_col, extra_cv_cols=extra_cv_cols)
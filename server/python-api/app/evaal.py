@@ -1,7 +1,9 @@
 # scripts/eval_grid.py
+import csv
 import os
 import itertools
 import importlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
 import numpy as np
@@ -11,7 +13,7 @@ from tqdm import tqdm
 
 # app internals (assumes running from project root)
 import app.engine as engmod
-from app.engine import get_engine
+from app.engine import get_engine, topk_desc
 from app.reranker import rerank_pairs               # single-device CE
 from app.reranker_mp import rerank_pairs_multi      # multi-GPU CE
 from app.config import CE_MODEL_ID                  # your CE model id (only used for logging)
@@ -25,6 +27,7 @@ OUT_DIR.mkdir(parents=True, exist_ok=True)
 ALPHAS          = [0.5, 0.7, 0.8]
 CANDIDATE_TOPKS = [100, 200, 400]
 TOPKS           = [5, 10]
+CE_BATCH_SIZE   = 64     # raise as far as VRAM allows; CE runs once per (JD, cand_topk)
 
 # modes:
 #   (label, jd_col, cv_col, ce_cv_pref)
@@ -113,8 +116,74 @@ def rerank_with_multi_gpu(pairs, batch_size: int):
         return rerank_pairs(pairs, batch_size=batch_size)
 
 # ---------------- main ----------------
-def run_config(mode_label, jd_col, cv_col, ce_cv_pref, alpha, cand_topk, topk):
-    """Run one config across all JDs and save a CSV."""
+def config_tag(mode_label, alpha, cand_topk, topk):
+    return f"{mode_label}_a{alpha}_cand{cand_topk}_topk{topk}"
+
+def retrieve_for_ce(eng, jd_text, ce_cv_pref, cand_topk):
+    """Retrieve candidates for one JD and build its CE inputs. Returns (cands, priors, pairs) or None."""
+    # retrieve considering ALL CVs; return only candidates_topk
+    cands = eng.retrieve(
+        jd_text=jd_text,
+        k=int(cand_topk),
+        pool=int(eng.N_UNIQ),
+        rrf_k=60,
+        threshold=None,
+        cosine_floor=0.0,
+    )
+    if not cands:
+        return None
+    cv_texts = [pick_cv_text(c, ce_cv_pref) for c in cands]
+    priors   = [float(c.get("hybrid_score_0_100", 0.0)) / 100.0 for c in cands]
+    pairs    = [(jd_text, t) for t in cv_texts]
+    return cands, priors, pairs
+
+def blend_topk(cands, scores, priors, alpha, topk):
+    """Blend CE with prior and keep the top-k. Returns (uids, ids, final, ce, prior)."""
+    lo, hi = float(scores.min()), float(scores.max())
+    ce_norm = (scores - lo) / (hi - lo) if hi > lo else (scores * 0 + 1.0)
+    pri     = np.clip(np.asarray(priors, dtype=float), 0.0, 1.0)
+    final   = alpha * ce_norm + (1.0 - alpha) * pri
+
+    order = topk_desc(final, topk)
+    uids  = [int(cands[i]["cv_uid"]) for i in order]
+    ids   = [int(cands[i]["cv_id"]) if cands[i].get("cv_id") is not None else None for i in order]
+    return uids, ids, final[order], scores[order], pri[order]
+
+def append_partial(path, row, first: bool):
+    """Append one row to a partial CSV (truncate + header on the first row) instead of rewriting it."""
+    with open(path, "w" if first else "a", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(row.keys()))
+        if first:
+            w.writeheader()
+        w.writerow(row)
+
+def save_config(rows, tag, topk):
+    """Final save + quick summary for one config."""
+    df = pd.DataFrame(rows)
+    out_csv = OUT_DIR / f"eval_grid_{tag}.csv"
+    df.to_csv(out_csv, index=False)
+    print(f"Saved per-JD results → {out_csv}")
+
+    if len(df):
+        grp = df.groupby(["mode","alpha","candidates_topk","topk"], as_index=False).agg({
+            f"MRR@{topk}": "mean",
+            f"nDCG@{topk}": "mean",
+            f"Recall@{topk}": "mean",
+        }).rename(columns={
+            f"MRR@{topk}": "MRR_mean",
+            f"nDCG@{topk}": "nDCG_mean",
+            f"Recall@{topk}": "Recall_mean",
+        }).sort_values(["MRR_mean","nDCG_mean","Recall_mean"], ascending=False)
+        print("\nConfig summary:\n", grp.to_string(index=False))
+
+def run_mode(mode_label, jd_col, cv_col, ce_cv_pref):
+    """Run every (alpha, cand_topk, topk) config for one mode.
+
+    All JD queries are encoded and scored up front in one batched pass
+    (eng.prefetch). CE scores only depend on cand_topk, so per cand_topk JDs
+    are retrieved concurrently, all their CE pairs go through a single rerank
+    call, and the scores are reused for every (alpha, topk).
+    """
     eng = ensure_engine(jd_col=jd_col, cv_col=cv_col)
 
     # list JDs from the chosen jd_col
@@ -122,54 +191,21 @@ def run_config(mode_label, jd_col, cv_col, ce_cv_pref, alpha, cand_topk, topk):
     has_uid = "jd_uid" in jd_df.columns
     jd_series = jd_df[jd_col].astype(str)
 
-    rows = []
-    all_docs = eng.N_UNIQ
-    print(f"\n=== MODE={mode_label} | jd_col={jd_col} | cv_col={cv_col} | CE={ce_cv_pref} | "
-          f"alpha={alpha} | candidates_topk={cand_topk} | topk={topk} | CVs={all_docs} ===")
-
-    # file paths
-    tag = f"{mode_label}_a{alpha}_cand{cand_topk}_topk{topk}"
-    out_csv = OUT_DIR / f"eval_grid_{tag}.csv"
-    partial_csv = OUT_DIR / f"eval_grid_{tag}_partial.csv"
-
-    for idx in tqdm(range(len(jd_series)), desc=f"JDs ({tag})"):
-        jd_text = str(jd_series.iloc[idx])
-        jd_uid  = int(jd_df.iloc[idx]["jd_uid"]) if has_uid else idx
-
-        # load GT
-        gt_uid, gt_id = load_gt_ids_for_jd(jd_uid)
-        if not gt_uid and not gt_id:
-            # no GT for this JD; skip
-            continue
-
-        # 1) retrieve considering ALL CVs; return only candidates_topk
-        cands = eng.retrieve(
-            jd_text=jd_text,
-            k=int(cand_topk),
-            pool=int(all_docs),
-            rrf_k=60,
-            threshold=None,
-            cosine_floor=0.0,
-        )
-        if not cands:
-            continue
-
-        # 2) build CE pairs and compute scores
-        cv_texts = [pick_cv_text(c, ce_cv_pref) for c in cands]
-        priors   = [float(c.get("hybrid_score_0_100", 0.0)) / 100.0 for c in cands]
-        pairs    = [(jd_text, t) for t in cv_texts]
+    # load GT once, then batch-encode / batch-score every JD that has GT in one pass
+    jd_uids = [int(jd_df.iloc[idx]["jd_uid"]) if has_uid else idx for idx in range(len(jd_series))]
+    gts = {uid: load_gt_ids_for_jd(uid) for uid in jd_uids}
+    eng.prefetch([jd_series.iloc[i] for i, uid in enumerate(jd_uids) if gts[uid][0] or gts[uid][1]])
 
-        scores = rerank_with_multi_gpu(pairs, batch_size=32)
-
-        # 3) blend CE with prior
-        lo, hi = float(scores.min()), float(scores.max())
-        ce_norm = (scores - lo) / (hi - lo) if hi > lo else (scores * 0 + 1.0)
-        pri     = np.clip(np.asarray(priors, dtype=float), 0.0, 1.0)
-        final   = alpha * ce_norm + (1.0 - alpha) * pri
+    configs = [(a, int(c), int(t)) for a, c, t in itertools.product(ALPHAS, CANDIDATE_TOPKS, TOPKS)]
+    jobs = [(jd_uids[i], str(jd_series.iloc[i])) for i in range(len(jd_series)) if any(gts[jd_uids[i]])]
+    print(f"\n=== MODE={mode_label} | jd_col={jd_col} | cv_col={cv_col} | CE={ce_cv_pref} | "
+          f"configs={len(configs)} | JDs with GT={len(jobs)} | CVs={eng.N_UNIQ} ===")
 
-        order = np.argsort(-final)[:topk]
-        uids  = [int(cands[i]["cv_uid"]) for i in order]
-        ids   = [int(cands[i]["cv_id"]) if cands[i].get("cv_id") is not None else None for i in order]
+    def add_row(cfg, jd_uid, cands, scores, priors):
+        """Blend one JD's CE scores for cfg=(alpha, cand_topk, topk), score against GT, record the row."""
+        alpha, cand_topk, topk = cfg
+        uids, ids, final, ce, pri = blend_topk(cands, scores, priors, alpha, topk)
+        gt_uid, gt_id = gts[jd_uid]
 
         # metrics using whichever GT you have
         R_at_k = max(
@@ -185,7 +221,8 @@ def run_config(mode_label, jd_col, cv_col, ce_cv_pref, alpha, cand_topk, topk):
             ndcg_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0
         )
 
-        rows.append({
+        cfg_rows = rows[cfg]
+        cfg_rows.append({
             "mode": mode_label,
             "jd_uid": jd_uid,
             "jd_col": jd_col,
@@ -199,45 +236,45 @@ def run_config(mode_label, jd_col, cv_col, ce_cv_pref, alpha, cand_topk, topk):
             f"nDCG@{topk}": NDCG,
             "pred_cv_uids": uids,
             "pred_cv_ids": ids,
-            "final_scores": [float(final[i]) for i in order],
-            "ce_scores": [float(scores[i]) for i in order],
-            "prior_scores": [float(pri[i]) for i in order],
+            "final_scores": [float(x) for x in final],
+            "ce_scores": [float(x) for x in ce],
+            "prior_scores": [float(x) for x in pri],
         })
 
-        # partial save after every JD
-        pd.DataFrame(rows).to_csv(partial_csv, index=False)
-
-    # final save for this config
-    df = pd.DataFrame(rows)
-    df.to_csv(out_csv, index=False)
-    print(f"Saved per-JD results → {out_csv}")
-
-    # quick per-config summary
-    if len(df):
-        grp = df.groupby(["mode","alpha","candidates_topk","topk"], as_index=False).agg({
-            f"MRR@{topk}": "mean",
-            f"nDCG@{topk}": "mean",
-            f"Recall@{topk}": "mean",
-        }).rename(columns={
-            f"MRR@{topk}": "MRR_mean",
-            f"nDCG@{topk}": "nDCG_mean",
-            f"Recall@{topk}": "Recall_mean",
-        }).sort_values(["MRR_mean","nDCG_mean","Recall_mean"], ascending=False)
-        print("\nConfig summary:\n", grp.to_string(index=False))
+        # partial save after every JD (append just this row)
+        tag = config_tag(mode_label, alpha, cand_topk, topk)
+        append_partial(OUT_DIR / f"eval_grid_{tag}_partial.csv", cfg_rows[-1], first=len(cfg_rows) == 1)
+
+    rows = {cfg: [] for cfg in configs}
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as ex:
+        # CE scores depend only on cand_topk: retrieve + rerank once per cand_topk, reuse for every (alpha, topk)
+        for cand_topk in tqdm(sorted({c for _, c, _ in configs}), desc=f"cand_topk ({mode_label})"):
+            # 1) retrieve every JD concurrently (fusion is NumPy/FAISS work on prefetched branch scores)
+            retrieved = list(ex.map(lambda job: retrieve_for_ce(eng, job[1], ce_cv_pref, cand_topk), jobs))
+
+            # 2) one CE pass over all JDs' pairs so the reranker sees full batches
+            all_pairs = [p for r in retrieved if r is not None for p in r[2]]
+            all_scores = np.asarray(rerank_with_multi_gpu(all_pairs, batch_size=CE_BATCH_SIZE), dtype=float) if all_pairs else None
+
+            # 3) split scores back per JD, then blend + evaluate every (alpha, topk)
+            off = 0
+            for (jd_uid, _), r in zip(jobs, retrieved):
+                if r is None:
+                    continue
+                cands, priors, pairs = r
+                scores = all_scores[off:off + len(pairs)]
+                off += len(pairs)
+                for cfg in configs:
+                    if cfg[1] == cand_topk:
+                        add_row(cfg, jd_uid, cands, scores, priors)
+
+    for (alpha, cand_topk, topk), cfg_rows in rows.items():
+        save_config(cfg_rows, config_tag(mode_label, alpha, cand_topk, topk), topk)
 
 def main():
     # full grid
     for (mode_label, jd_col, cv_col, ce_cv_pref) in MODES:
-        for alpha, cand_topk, topk in itertools.product(ALPHAS, CANDIDATE_TOPKS, TOPKS):
-            run_config(
-                mode_label=mode_label,
-                jd_col=jd_col,
-                cv_col=cv_col,
-                ce_cv_pref=ce_cv_pref,
-                alpha=alpha,
-                cand_topk=int(cand_topk),
-                topk=int(topk),
-            )
+        run_mode(mode_label=mode_label, jd_col=jd_col, cv_col=cv_col, ce_cv_pref=ce_cv_pref)
 
     # combine all runs into a global summary
     all_csvs = list(OUT_DIR.glob("eval_grid_*.csv"))
@@ -1,4 +1,6 @@
+import csv
 import itertools
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 import importlib
 import numpy as np
@@ -7,7 +9,8 @@ import torch
 from tqdm import tqdm
 from typing import Optional
 from app.engine import get_engine
-from app.reranker import rerank_pairs
+from app.fast_eval import eval_group, warmup
+from app.reranker import rerank_topk
 from app.reranker_mp import rerank_pairs_multi
 
 # ------------------- USER SETUP -------------------
@@ -24,6 +27,7 @@ RRF_K        = 60
 THRESHOLD    = None
 COSINE_FLOOR = 0.0
 BATCH_SIZE   = 32
+GT_WORKERS   = 8      # threads for the up-front GT CSV read
 
 # Exactly two modes, matching your API behavior:
 MODES = [
@@ -33,31 +37,6 @@ MODES = [
 # --------------------------------------------------
 
 
-# ---------------- metrics ----------------
-def recall_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    return float(any(p in S for p in pred_ids[:k]))
-
-def mrr_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    for i, p in enumerate(pred_ids[:k], start=1):
-        if p in S:
-            return 1.0 / i
-    return 0.0
-
-def ndcg_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    dcg = 0.0
-    for i, p in enumerate(pred_ids[:k], start=1):
-        if p in S:
-            dcg += 1.0 / np.log2(i + 1.0)
-    m = min(k, len(S))
-    if m == 0:
-        return 0.0
-    idcg = sum(1.0 / np.log2(i + 1.0) for i in range(1, m + 1))
-    return dcg / idcg
-
-
 # -------------- GT loader ---------------
 def load_gt_ids_for_jd(uid: int):
     path = GT_DIR / GT_TEMPLATE.format(uid=uid)
@@ -87,6 +66,22 @@ def load_gt_ids_for_jd(uid: int):
     return set(gt_uid), set(gt_id)
 
 
+# jd_uid -> (gt_uid, gt_id); filled once by load_gt_cache() at the top of main()
+GT_CACHE = {}
+
+def load_gt_cache():
+    """Parse every GT file in GT_DIR once (in parallel), keyed by the uid in its filename."""
+    prefix, suffix = GT_TEMPLATE.split("{uid}")
+    uids = []
+    for p in GT_DIR.glob(GT_TEMPLATE.format(uid="*")):
+        try:
+            uids.append(int(p.name[len(prefix):len(p.name) - len(suffix)]))
+        except ValueError:
+            pass
+    with ThreadPoolExecutor(max_workers=GT_WORKERS) as ex:
+        return dict(zip(uids, ex.map(load_gt_ids_for_jd, uids)))
+
+
 # -------- API-accurate helpers (match app/api.py) --------
 def _resolve_to_other_col(eng, jd_clean_text: str, target_col: Optional[str]) -> str:
     """
@@ -95,12 +90,8 @@ def _resolve_to_other_col(eng, jd_clean_text: str, target_col: Optional[str]) ->
     """
     if not target_col or target_col not in eng.jd.columns or eng.jd_col not in eng.jd.columns:
         return str(jd_clean_text)
-    mask = eng.jd[eng.jd_col].astype(str) == str(jd_clean_text)
-    if mask.any():
-        cand = eng.jd.loc[mask, target_col].astype(str)
-        if not cand.empty:
-            return cand.iloc[cand.str.len().argmax()]
-    return str(jd_clean_text)
+    jd_clean_text = str(jd_clean_text)
+    return eng.resolve_map(target_col).get(jd_clean_text, jd_clean_text)
 
 def _pick_cv_text(item: dict, prefer_col: str) -> str:
     """Exactly the CE text selector used in the API."""
@@ -148,12 +139,14 @@ def run_one_jd(
 
     pairs = [(jd_query, t) for t in texts]
 
-    # Multi-GPU if available
-    if torch.cuda.is_available() and torch.cuda.device_count() > 1:
-        devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
-        scores = rerank_pairs_multi(pairs, "BAAI/bge-reranker-base", batch_size=BATCH_SIZE, devices=devices)
-    else:
-        scores = rerank_pairs(pairs, batch_size=BATCH_SIZE)
+    # Single device: blend + top-k on the CE's device, only topk values come back
+    if not (torch.cuda.is_available() and torch.cuda.device_count() > 1):
+        final, order, scores = rerank_topk(pairs, priors, alpha, topk, batch_size=BATCH_SIZE)
+        return [uids[i] for i in order], [ids[i] for i in order], final, scores, np.clip(np.asarray(priors, dtype=float)[order], 0.0, 1.0)
+
+    # Multi-GPU: score on the worker pool, blend on the host
+    devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
+    scores = rerank_pairs_multi(pairs, "BAAI/bge-reranker-base", batch_size=BATCH_SIZE, devices=devices)
 
     scores = np.asarray(scores, dtype=float)
     pri    = np.asarray(priors, dtype=float)
@@ -168,9 +161,20 @@ def run_one_jd(
     return [uids[i] for i in order], [ids[i] for i in order], final[order], scores[order], prior[order]
 
 
+def append_partial(path, row, first: bool):
+    """Append one row to a partial CSV (truncate + header on the first row) instead of rewriting it."""
+    with open(path, "w" if first else "a", newline="") as f:
+        w = csv.DictWriter(f, fieldnames=list(row.keys()))
+        if first:
+            w.writeheader()
+        w.writerow(row)
+
+
 # ----------------------- main -----------------------
 def main():
     all_rows = []
+    GT_CACHE.update(load_gt_cache())   # every GT CSV parsed exactly once for all modes/configs
+    warmup()   # JIT-compile the metric kernels once, outside the timed loops
 
     for (mode_label, jd_col, cv_col, resolve_to, ce_pref) in MODES:
         # Build engine on EXACT columns (like API). We also expose extra CV cols for CE selection.
@@ -182,29 +186,33 @@ def main():
         jd_df = eng.jd_unique if hasattr(eng, "jd_unique") else eng.jd
         has_uid = "jd_uid" in jd_df.columns
 
-        # get jd_input_texts from clean_jd (not from jd_col!)
+        # get jd_input_texts from clean_jd (not from jd_col!); plain arrays, cells str()'d on use
         if "clean_jd" in jd_df.columns:
-            jd_input_series = jd_df["clean_jd"].astype(str)
+            jd_input_array = jd_df["clean_jd"].fillna("").to_numpy()
         else:
             # fallback to raw table if unique view lacks clean_jd
-            jd_input_series = eng.jd["clean_jd"].drop_duplicates().reset_index(drop=True).astype(str)
+            jd_input_array = eng.jd["clean_jd"].drop_duplicates().fillna("").to_numpy()
+        jd_uid_array = jd_df["jd_uid"].to_numpy() if has_uid else None
+
+        # only JDs with ground truth are worth retrieving / reranking
+        valid_idx = [idx for idx in range(len(jd_input_array))
+                     if any(GT_CACHE.get(int(jd_uid_array[idx]) if has_uid else idx, ()))]
 
         for alpha, candidate_topk, topk in itertools.product(ALPHAS, CANDIDATE_TOPKS, TOPKS):
             tag = f"{mode_label}_a{alpha}_cand{candidate_topk}_topk{topk}"
             part_path = OUT_DIR / f"partial_{tag}.csv"
             rows = []
+            gts_uid, gts_id = [], []
 
             print(f"\n=== MODE={mode_label} | jd_col={jd_col} | cv_col={cv_col} | resolve={resolve_to} | "
                   f"CE={ce_pref} | alpha={alpha} | cand_topk={candidate_topk} | topk={topk} ===")
 
-            for idx in tqdm(range(len(jd_input_series)), desc=f"JDs[{tag}]"):
-                jd_uid = int(jd_df.iloc[idx]["jd_uid"]) if has_uid else idx
-                jd_input_text = str(jd_input_series.iloc[idx])
+            for idx in tqdm(valid_idx, desc=f"JDs[{tag}]"):
+                jd_uid = int(jd_uid_array[idx]) if has_uid else idx
+                jd_input_text = str(jd_input_array[idx])
 
-                # Load ground-truth for this JD
-                gt_uid, gt_id = load_gt_ids_for_jd(jd_uid)
-                if not gt_uid and not gt_id:
-                    continue
+                # Ground-truth for this JD (non-empty: valid_idx)
+                gt_uid, gt_id = GT_CACHE[jd_uid]
 
                 uids, ids, final, ce, pri = run_one_jd(
                     eng=eng,
@@ -216,19 +224,9 @@ def main():
                     alpha=alpha,
                 )
 
-                # Metrics
-                R_uid = recall_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0
-                R_id  = recall_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0
-                R_at_k = max(R_uid, R_id)
-
-                MRR = max(
-                    mrr_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0,
-                    mrr_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0,
-                )
-                NDCG = max(
-                    ndcg_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0,
-                    ndcg_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0,
-                )
+                # metrics are filled for all JDs at once after the loop (eval_group)
+                gts_uid.append(gt_uid)
+                gts_id.append(gt_id)
 
                 rows.append({
                     "mode": mode_label,
@@ -240,9 +238,9 @@ def main():
                     "alpha": alpha,
                     "candidates_topk": candidate_topk,
                     "topk": topk,
-                    f"Recall@{topk}": R_at_k,
-                    f"MRR@{topk}": MRR,
-                    f"nDCG@{topk}": NDCG,
+                    f"Recall@{topk}": np.nan,
+                    f"MRR@{topk}": np.nan,
+                    f"nDCG@{topk}": np.nan,
                     "pred_cv_uids": uids,
                     "pred_cv_ids": ids,
                     "final_scores": [float(x) for x in np.asarray(final, float).tolist()],
@@ -250,7 +248,17 @@ def main():
                     "prior_scores": [float(x) for x in np.asarray(pri, float).tolist()],
                 })
 
-                # write incrementally
+                # append incrementally (metrics are NaN until the per-config eval_group pass below)
+                append_partial(part_path, rows[-1], first=len(rows) == 1)
+
+            # Metrics for every JD in one compiled pass: best of uid-GT and id-GT, per metric;
+            # then the partial CSV is rewritten once with the metrics filled in
+            if rows:
+                by_uid = eval_group([r["pred_cv_uids"] for r in rows], gts_uid, topk)
+                by_id  = eval_group([r["pred_cv_ids"] for r in rows], gts_id, topk)
+                for name, u, i in zip((f"Recall@{topk}", f"MRR@{topk}", f"nDCG@{topk}"), by_uid, by_id):
+                    for r, v in zip(rows, np.maximum(u, i).tolist()):
+                        r[name] = v
                 pd.DataFrame(rows).to_csv(part_path, index=False)
 
             all_rows.extend(rows)
@@ -265,23 +273,19 @@ def main():
     full.to_csv(full_path, index=False)
     print(f"\nSaved per-JD rows → {full_path}")
 
-    # Summaries per (mode, alpha, candidates_topk, topk)
-    summaries = []
-    for tk in sorted(set(full["topk"].tolist())):
-        sub = full[full["topk"] == tk]
-        grp = sub.groupby(["mode", "alpha", "candidates_topk", "topk"], as_index=False).agg({
-            f"MRR@{tk}": "mean",
-            f"nDCG@{tk}": "mean",
-            f"Recall@{tk}": "mean",
-        }).rename(columns={
-            f"MRR@{tk}": "MRR_mean",
-            f"nDCG@{tk}": "nDCG_mean",
-            f"Recall@{tk}": "Recall_mean",
-        })
-        summaries.append(grp)
-
-    summary = pd.concat(summaries, ignore_index=True).sort_values(
-        ["MRR_mean", "nDCG_mean", "Recall_mean"], ascending=False
+    # Summaries per (mode, alpha, candidates_topk, topk): one long-format groupby across every topk's metric columns
+    keys = ["mode", "alpha", "candidates_topk", "topk"]
+    long = full.melt(
+        id_vars=keys,
+        value_vars=[c for c in full.columns if c.startswith(("MRR@", "nDCG@", "Recall@"))],
+        var_name="metric", value_name="value",
+    ).dropna(subset=["value"])   # a row only carries metrics for its own topk
+    long["metric"] = long["metric"].str.split("@").str[0] + "_mean"
+    summary = (
+        long.groupby(keys + ["metric"])["value"].mean()
+            .unstack("metric").rename_axis(columns=None).reset_index()
+            [keys + ["MRR_mean", "nDCG_mean", "Recall_mean"]]
+            .sort_values(["MRR_mean", "nDCG_mean", "Recall_mean"], ascending=False)
     )
     summary_path = OUT_DIR / "eval_two_modes_summary.csv"
     summary.to_csv(summary_path, index=False)
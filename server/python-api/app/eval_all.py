@@ -1,12 +1,16 @@
+import csv
 import itertools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
 from pathlib import Path
 import importlib
 import numpy as np
 import pandas as pd
 import torch
 from tqdm import tqdm
-from typing import Optional
+from typing import Dict, Optional
 from app.engine import get_engine
+from app.fast_eval import NO_ID, blend_rank_score, warmup
 from app.reranker import rerank_pairs
 from app.reranker_mp import rerank_pairs_multi
 
@@ -24,6 +28,8 @@ RRF_K        = 60
 THRESHOLD    = None
 COSINE_FLOOR = 0.0
 BATCH_SIZE   = 32
+JD_BATCH     = 16     # JDs whose CE pairs are pooled into one rerank call
+GT_WORKERS   = 8      # threads for the up-front GT CSV read
 
 # Exactly two modes, matching your API behavior:
 MODES = [
@@ -33,31 +39,6 @@ MODES = [
 # --------------------------------------------------
 
 
-# ---------------- metrics ----------------
-def recall_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    return float(any(p in S for p in pred_ids[:k]))
-
-def mrr_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    for i, p in enumerate(pred_ids[:k], start=1):
-        if p in S:
-            return 1.0 / i
-    return 0.0
-
-def ndcg_at_k(pred_ids, gt_ids, k=5):
-    S = set(gt_ids)
-    dcg = 0.0
-    for i, p in enumerate(pred_ids[:k], start=1):
-        if p in S:
-            dcg += 1.0 / np.log2(i + 1.0)
-    m = min(k, len(S))
-    if m == 0:
-        return 0.0
-    idcg = sum(1.0 / np.log2(i + 1.0) for i in range(1, m + 1))
-    return dcg / idcg
-
-
 # -------------- GT loader ---------------
 def load_gt_ids_for_jd(uid: int):
     path = GT_DIR / GT_TEMPLATE.format(uid=uid)
@@ -84,23 +65,39 @@ def load_gt_ids_for_jd(uid: int):
                         pass
                 gt_uid = ints
                 break
-    return set(gt_uid), set(gt_id)
+    return frozenset(gt_uid), frozenset(gt_id)
+
+
+# jd_uid -> (gt_uid, gt_id); filled once by load_gt_cache() at the top of main()
+GT_CACHE = {}
+
+def load_gt_cache():
+    """Parse every GT file in GT_DIR once (in parallel), keyed by the uid in its filename."""
+    prefix, suffix = GT_TEMPLATE.split("{uid}")
+    uids = []
+    for p in GT_DIR.glob(GT_TEMPLATE.format(uid="*")):
+        try:
+            uids.append(int(p.name[len(prefix):len(p.name) - len(suffix)]))
+        except ValueError:
+            pass
+    with ThreadPoolExecutor(max_workers=GT_WORKERS) as ex:
+        return dict(zip(uids, ex.map(load_gt_ids_for_jd, uids)))
 
 
 # -------- API-accurate helpers (match app/api.py) --------
-def _resolve_to_other_col(eng, jd_clean_text: str, target_col: Optional[str]) -> str:
+def build_resolve_map(eng, target_col: Optional[str]) -> Dict[str, str]:
     """
-    If target_col is provided and exists in eng.jd, try exact-match lookup
-    from eng.jd_col -> target_col. Otherwise return jd_clean_text as-is.
+    eng.jd_col value -> longest target_col value among rows sharing it (cached on the engine).
+    Empty when target_col is not set or missing from eng.jd.
     """
     if not target_col or target_col not in eng.jd.columns or eng.jd_col not in eng.jd.columns:
-        return str(jd_clean_text)
-    mask = eng.jd[eng.jd_col].astype(str) == str(jd_clean_text)
-    if mask.any():
-        cand = eng.jd.loc[mask, target_col].astype(str)
-        if not cand.empty:
-            return cand.iloc[cand.str.len().argmax()]
-    return str(jd_clean_text)
+        return {}
+    return eng.resolve_map(target_col)
+
+def _resolve_to_other_col(resolve_map: Dict[str, str], jd_clean_text: str) -> str:
+    """Exact-match lookup jd_col -> target_col via build_resolve_map; falls back to jd_clean_text."""
+    jd_clean_text = str(jd_clean_text)
+    return resolve_map.get(jd_clean_text, jd_clean_text)
 
 def _pick_cv_text(item: dict, prefer_col: str) -> str:
     """Exactly the CE text selector used in the API."""
@@ -114,18 +111,21 @@ def _pick_cv_text(item: dict, prefer_col: str) -> str:
 
 
 # -------------- Matching core (API-accurate) ---------------
-def run_one_jd(
+def retrieve_candidates(
     *,
     eng,
     jd_input_text: str,          # always the *clean_jd* value (per your requirement)
-    resolve_jd_to_col: Optional[str],
+    resolve_map: Dict[str, str],   # from build_resolve_map; {} = no resolve
     cv_text_for_ce: str,
     candidate_topk: int,
-    topk: int,
-    alpha: float,
 ):
+    """Retrieval for one JD. Independent of alpha/topk, so callers reuse it across the grid.
+
+    Returns (pairs, uids, ids, priors) aligned over the candidate list; CE is run
+    separately (score_pairs) so pairs from several JDs can share one call.
+    """
     # Optional resolve clean -> summary (or None)
-    jd_query = _resolve_to_other_col(eng, jd_input_text, resolve_jd_to_col)
+    jd_query = _resolve_to_other_col(resolve_map, jd_input_text)
 
     # Retrieval: consider ALL CVs, return only candidate_topk
     all_docs = eng.N_UNIQ
@@ -138,39 +138,36 @@ def run_one_jd(
         cosine_floor=COSINE_FLOOR,
     )
     if not cands:
-        return [], [], [], [], []
+        return [], np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
 
     # Build CE pairs
     texts  = [_pick_cv_text(c, cv_text_for_ce) for c in cands]
-    priors = [float(c.get("hybrid_score_0_100", 0.0)) / 100.0 for c in cands]
-    uids   = [int(c["cv_uid"]) for c in cands]
-    ids    = [int(c["cv_id"]) if c.get("cv_id") is not None else None for c in cands]
+    priors = np.fromiter((c.get("hybrid_score_0_100", 0.0) for c in cands), dtype=np.float32, count=len(cands)) / np.float32(100.0)
+    uids   = np.fromiter((int(c["cv_uid"]) for c in cands), dtype=np.int64, count=len(cands))
+    ids    = np.fromiter((int(c["cv_id"]) if c.get("cv_id") is not None else NO_ID for c in cands), dtype=np.int64, count=len(cands))
 
     pairs = [(jd_query, t) for t in texts]
+    return pairs, uids, ids, np.clip(priors, 0.0, 1.0)
+
 
+def score_pairs(pairs) -> np.ndarray:
+    """One CE call over (possibly many JDs') pairs."""
+    if not pairs:
+        return np.zeros(0, dtype=np.float32)
     # Multi-GPU if available
     if torch.cuda.is_available() and torch.cuda.device_count() > 1:
         devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
-        scores = rerank_pairs_multi(pairs, "BAAI/bge-reranker-base", batch_size=BATCH_SIZE, devices=devices)
+        scores = rerank_pairs_multi(pairs, "BAAI/bge-reranker-base", batch_size=BATCH_SIZE * len(devices), devices=devices)
     else:
         scores = rerank_pairs(pairs, batch_size=BATCH_SIZE)
-
-    scores = np.asarray(scores, dtype=float)
-    pri    = np.asarray(priors, dtype=float)
-
-    # Blend
-    lo, hi = float(scores.min()), float(scores.max())
-    ce_norm = (scores - lo) / (hi - lo) if hi > lo else (scores * 0 + 1.0)
-    prior   = np.clip(pri, 0.0, 1.0)
-    final   = alpha * ce_norm + (1.0 - alpha) * prior
-
-    order = np.argsort(-final)[:topk]
-    return [uids[i] for i in order], [ids[i] for i in order], final[order], scores[order], prior[order]
+    return np.asarray(scores, dtype=np.float32)
 
 
 # ----------------------- main -----------------------
 def main():
     all_rows = []
+    GT_CACHE.update(load_gt_cache())   # every GT CSV parsed exactly once for all modes/configs
+    warmup()   # JIT-compile the ranking tail once, outside the timed loops
 
     for (mode_label, jd_col, cv_col, resolve_to, ce_pref) in MODES:
         # Build engine on EXACT columns (like API). We also expose extra CV cols for CE selection.
@@ -182,55 +179,55 @@ def main():
         jd_df = eng.jd_unique if hasattr(eng, "jd_unique") else eng.jd
         has_uid = "jd_uid" in jd_df.columns
 
-        # get jd_input_texts from clean_jd (not from jd_col!)
+        # get jd_input_texts from clean_jd (not from jd_col!); plain arrays, cells str()'d on use
         if "clean_jd" in jd_df.columns:
-            jd_input_series = jd_df["clean_jd"].astype(str)
+            jd_input_array = jd_df["clean_jd"].fillna("").to_numpy()
         else:
             # fallback to raw table if unique view lacks clean_jd
-            jd_input_series = eng.jd["clean_jd"].drop_duplicates().reset_index(drop=True).astype(str)
-
-        for alpha, candidate_topk, topk in itertools.product(ALPHAS, CANDIDATE_TOPKS, TOPKS):
-            tag = f"{mode_label}_a{alpha}_cand{candidate_topk}_topk{topk}"
-            part_path = OUT_DIR / f"partial_{tag}.csv"
-            rows = []
-
-            print(f"\n=== MODE={mode_label} | jd_col={jd_col} | cv_col={cv_col} | resolve={resolve_to} | "
-                  f"CE={ce_pref} | alpha={alpha} | cand_topk={candidate_topk} | topk={topk} ===")
-
-            for idx in tqdm(range(len(jd_input_series)), desc=f"JDs[{tag}]"):
-                jd_uid = int(jd_df.iloc[idx]["jd_uid"]) if has_uid else idx
-                jd_input_text = str(jd_input_series.iloc[idx])
-
-                # Load ground-truth for this JD
-                gt_uid, gt_id = load_gt_ids_for_jd(jd_uid)
-                if not gt_uid and not gt_id:
-                    continue
-
-                uids, ids, final, ce, pri = run_one_jd(
-                    eng=eng,
-                    jd_input_text=jd_input_text,
-                    resolve_jd_to_col=resolve_to,
-                    cv_text_for_ce=ce_pref,
-                    candidate_topk=candidate_topk,
-                    topk=topk,
-                    alpha=alpha,
-                )
-
-                # Metrics
-                R_uid = recall_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0
-                R_id  = recall_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0
-                R_at_k = max(R_uid, R_id)
-
-                MRR = max(
-                    mrr_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0,
-                    mrr_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0,
-                )
-                NDCG = max(
-                    ndcg_at_k(uids, gt_uid, k=topk) if gt_uid else 0.0,
-                    ndcg_at_k([x for x in ids if x is not None], gt_id, k=topk) if gt_id else 0.0,
-                )
-
-                rows.append({
+            jd_input_array = eng.jd["clean_jd"].drop_duplicates().fillna("").to_numpy()
+        jd_uid_array = jd_df["jd_uid"].to_numpy() if has_uid else None
+
+        # only JDs with ground truth are worth retrieving / reranking
+        valid_idx = [idx for idx in range(len(jd_input_array))
+                     if any(GT_CACHE.get(int(jd_uid_array[idx]) if has_uid else idx, ()))]
+
+        # clean -> resolve_to lookup, O(1) per JD
+        resolve_map = build_resolve_map(eng, resolve_to)
+
+        configs = list(itertools.product(ALPHAS, CANDIDATE_TOPKS, TOPKS))
+        rows = {cfg: [] for cfg in configs}
+        # (jd_input_text, candidate_topk) -> (uids, ids, ce, prior); only the blend varies across alpha/topk
+        scored = {}
+        # pending (jd_uid, gt_uid, gt_id, candidate_topk, key, retrieved) awaiting one pooled CE call
+        jd_batch = []
+
+        # one append-only partial CSV per config, opened on its first row and closed after the mode
+        part_files = ExitStack()
+        part_writers = {}
+
+        def part_writer(alpha, candidate_topk, topk, row):
+            cfg = (alpha, candidate_topk, topk)
+            if cfg not in part_writers:
+                tag = f"{mode_label}_a{alpha}_cand{candidate_topk}_topk{topk}"
+                fh = part_files.enter_context(open(OUT_DIR / f"partial_{tag}.csv", "w", newline=""))
+                part_writers[cfg] = (fh, csv.DictWriter(fh, fieldnames=list(row)))
+                part_writers[cfg][1].writeheader()
+            return part_writers[cfg][1]
+
+        def emit(jd_uid, gt_uid, gt_id, candidate_topk, key):
+            cand_uids, cand_ids, ce_all, pri_all = scored[key]
+            gt_uid_arr = np.sort(np.fromiter(gt_uid, dtype=np.int64, count=len(gt_uid)))
+            gt_id_arr  = np.sort(np.fromiter(gt_id, dtype=np.int64, count=len(gt_id)))
+            for alpha, topk in itertools.product(ALPHAS, TOPKS):
+                # compiled blend + top-k + metrics (best of uid-GT and id-GT, per metric)
+                R_at_k, MRR, NDCG, final, order = blend_rank_score(
+                    ce_all, pri_all, alpha, gt_uid_arr, gt_id_arr, cand_uids, cand_ids, topk)
+                uids = cand_uids[order].tolist()
+                ids  = [None if x == NO_ID else x for x in cand_ids[order].tolist()]
+                final, ce, pri = final[order], ce_all[order], pri_all[order]
+
+                cfg_rows = rows[(alpha, candidate_topk, topk)]
+                cfg_rows.append({
                     "mode": mode_label,
                     "jd_uid": jd_uid,
                     "jd_col": jd_col,
@@ -245,15 +242,59 @@ def main():
                     f"nDCG@{topk}": NDCG,
                     "pred_cv_uids": uids,
                     "pred_cv_ids": ids,
-                    "final_scores": [float(x) for x in np.asarray(final, float).tolist()],
-                    "ce_scores": [float(x) for x in np.asarray(ce, float).tolist()],
-                    "prior_scores": [float(x) for x in np.asarray(pri, float).tolist()],
+                    "final_scores": final.tolist(),
+                    "ce_scores": ce.tolist(),
+                    "prior_scores": pri.tolist(),
                 })
 
-                # write incrementally
-                pd.DataFrame(rows).to_csv(part_path, index=False)
+                # write incrementally (append this row only)
+                part_writer(alpha, candidate_topk, topk, cfg_rows[-1]).writerow(cfg_rows[-1])
+
+        def flush():
+            # CE for every not-yet-scored key in the batch, in one call; demux by cumulative offsets
+            todo = {}
+            for *_, key, retrieved in jd_batch:
+                if key not in scored and key not in todo:
+                    todo[key] = retrieved
+            flat = [p for pairs, *_ in todo.values() for p in pairs]
+            all_scores = score_pairs(flat)
+            off = 0
+            for key, (pairs, uids, ids, priors) in todo.items():
+                scored[key] = (uids, ids, all_scores[off:off + len(pairs)], priors)
+                off += len(pairs)
+            for jd_uid, gt_uid, gt_id, candidate_topk, key, _ in jd_batch:
+                emit(jd_uid, gt_uid, gt_id, candidate_topk, key)
+            jd_batch.clear()
+            for fh, _ in part_writers.values():
+                fh.flush()  # partials stay current on disk after every batch
+
+        print(f"\n=== MODE={mode_label} | jd_col={jd_col} | cv_col={cv_col} | resolve={resolve_to} | "
+              f"CE={ce_pref} | alphas={ALPHAS} | cand_topks={CANDIDATE_TOPKS} | topks={TOPKS} ===")
+
+        for idx in tqdm(valid_idx, desc=f"JDs[{mode_label}]"):
+            jd_uid = int(jd_uid_array[idx]) if has_uid else idx
+            jd_input_text = str(jd_input_array[idx])
+
+            # Ground-truth for this JD (non-empty: valid_idx)
+            gt_uid, gt_id = GT_CACHE[jd_uid]
+
+            for candidate_topk in CANDIDATE_TOPKS:
+                key = (jd_input_text, candidate_topk)
+                retrieved = None if key in scored else retrieve_candidates(
+                    eng=eng,
+                    jd_input_text=jd_input_text,
+                    resolve_map=resolve_map,
+                    cv_text_for_ce=ce_pref,
+                    candidate_topk=candidate_topk,
+                )
+                jd_batch.append((jd_uid, gt_uid, gt_id, candidate_topk, key, retrieved))
+            if len(jd_batch) >= JD_BATCH * len(CANDIDATE_TOPKS):
+                flush()
+        flush()
+        part_files.close()
 
-            all_rows.extend(rows)
+        for cfg_rows in rows.values():
+            all_rows.extend(cfg_rows)
 
     # Save combined and summary
     if not all_rows:
@@ -265,23 +306,19 @@ def main():
     full.to_csv(full_path, index=False)
     print(f"\nSaved per-JD rows → {full_path}")
 
-    # Summaries per (mode, alpha, candidates_topk, topk)
-    summaries = []
-    for tk in sorted(set(full["topk"].tolist())):
-        sub = full[full["topk"] == tk]
-        grp = sub.groupby(["mode", "alpha", "candidates_topk", "topk"], as_index=False).agg({
-            f"MRR@{tk}": "mean",
-            f"nDCG@{tk}": "mean",
-            f"Recall@{tk}": "mean",
-        }).rename(columns={
-            f"MRR@{tk}": "MRR_mean",
-            f"nDCG@{tk}": "nDCG_mean",
-            f"Recall@{tk}": "Recall_mean",
-        })
-        summaries.append(grp)
-
-    summary = pd.concat(summaries, ignore_index=True).sort_values(
-        ["MRR_mean", "nDCG_mean", "Recall_mean"], ascending=False
+    # Summaries per (mode, alpha, candidates_topk, topk): one long-format groupby across every topk's metric columns
+    keys = ["mode", "alpha", "candidates_topk", "topk"]
+    long = full.melt(
+        id_vars=keys,
+        value_vars=[c for c in full.columns if c.startswith(("MRR@", "nDCG@", "Recall@"))],
+        var_name="metric", value_name="value",
+    ).dropna(subset=["value"])   # a row only carries metrics for its own topk
+    long["metric"] = long["metric"].str.split("@").str[0] + "_mean"
+    summary = (
+        long.groupby(keys + ["metric"])["value"].mean()
+            .unstack("metric").rename_axis(columns=None).reset_index()
+            [keys + ["MRR_mean", "nDCG_mean", "Recall_mean"]]
+            .sort_values(["MRR_mean", "nDCG_mean", "Recall_mean"], ascending=False)
     )
     summary_path = OUT_DIR / "eval_two_modes_summary.csv"
     summary.to_csv(summary_path, index=False)
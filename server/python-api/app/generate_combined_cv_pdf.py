@@ -6,8 +6,12 @@ Each candidate will have: Name, CV Summary (JSON), and Clean CV text.
 
 import os
 import sys
-import json
+import orjson
 import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 from pathlib import Path
 from typing import Dict, Any
 from reportlab.lib.pagesizes import letter
@@ -34,51 +38,78 @@ OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 OUTPUT_FILE = OUTPUT_DIR / "all_candidates_combined.pdf"
 
 
+# ReportLab markup escaping in one pass
+_ESCAPE = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+
+# Name tables for generate_candidate_name (built once at import)
+_MALE = (
+    "Saad", "Khalid", "Mohammed", "Ahmed", "Omar", "Yusuf", "Ibrahim", 
+    "Hassan", "Ali", "Faisal", "Sultan", "Nasser", "Majed", "Turki", "Bandar",
+    "Abdullah", "Fahad", "Saud", "Khalil", "Zaid", "Hamza", "Tariq", "Bader",
+    "Mansour", "Raed", "Waleed", "Fares", "Yazeed", "Khaled", "Saeed", "Nawaf",
+    "Mutaz", "Sami", "Hani", "Rami", "Fadi", "Tamer", "Yasser", "Bassam",
+    "Tarek", "Wael", "Ziyad", "Hatem", "Majid", "Nader", "Osama", "Karim"
+)
+_FEMALE = (
+    "Fatima", "Sara", "Noura", "Layla", "Amira", "Mariam", "Aisha", 
+    "Hala", "Rania", "Lina", "Dina", "Yasmin", "Reem", "Hanan", "Nada",
+    "Salma", "Rana", "Maya", "Leila", "Zeinab", "Hiba", "Rim", "Shaima",
+    "Maha", "Noor", "Rahaf", "Lama", "Rawan", "Dana", "Tala", "Raghad",
+    "Layan", "Jana", "Tara", "Yara", "Haya", "Nour", "Sana", "Hind",
+    "Amina", "Lubna", "Noora", "Farah", "Sanaa", "Huda", "Mona", "Nadia"
+)
+_LAST = tuple(dict.fromkeys([
+    "Alsaud", "Alotaibi", "Alharbi", "Alahmed", "Almutairi", "Alzahrani", 
+    "Alshammari", "Alqarni", "Almalki", "Alghamdi", "Almousa", "Alrashid", 
+    "Almazroa", "Alsharif", "Almuhanna", "Almawash", "Alshahrani", "Alqahtani", 
+    "Aldosari", "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori",
+    "Alhumaid", "Alsuwaidi", "Almazrouei", "Alshamsi", "Alnuaimi", "Aldhaheri",
+    "Alblushi", "Alhosani", "Almazmi", "Alshahwi", "Alhinai", "Alraisi",
+    "Alshukaili", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
+    "Alkhatib", "Alshehri", "Alshahwan", "Almajed", "Alharbi", "Aldosari",
+    "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid",
+    "Alsuwaidi", "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani",
+    "Alshahwan", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
+    "Alkhatib", "Alshehri", "Almajed", "Alharbi", "Aldosari", "Alhazmi",
+    "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid", "Alsuwaidi",
+    "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani", "Almazmi"
+]))  # deduplicated, first occurrence order
+
+
 def generate_candidate_name(cv_id: int) -> str:
     """
     Generate Arabic name in English letters based on cv_id.
     This matches the frontend name generation algorithm.
     """
-    arabic_male_names = [
-        "Saad", "Khalid", "Mohammed", "Ahmed", "Omar", "Yusuf", "Ibrahim", 
-        "Hassan", "Ali", "Faisal", "Sultan", "Nasser", "Majed", "Turki", "Bandar",
-        "Abdullah", "Fahad", "Saud", "Khalil", "Zaid", "Hamza", "Tariq", "Bader",
-        "Mansour", "Raed", "Waleed", "Fares", "Yazeed", "Khaled", "Saeed", "Nawaf",
-        "Mutaz", "Sami", "Hani", "Rami", "Fadi", "Tamer", "Yasser", "Bassam",
-        "Tarek", "Wael", "Ziyad", "Hatem", "Majid", "Nader", "Osama", "Karim"
-    ]
-    arabic_female_names = [
-        "Fatima", "Sara", "Noura", "Layla", "Amira", "Mariam", "Aisha", 
-        "Hala", "Rania", "Lina", "Dina", "Yasmin", "Reem", "Hanan", "Nada",
-        "Salma", "Rana", "Maya", "Leila", "Zeinab", "Hiba", "Rim", "Shaima",
-        "Maha", "Noor", "Rahaf", "Lama", "Rawan", "Dana", "Tala", "Raghad",
-        "Layan", "Jana", "Tara", "Yara", "Haya", "Nour", "Sana", "Hind",
-        "Amina", "Lubna", "Noora", "Farah", "Sanaa", "Huda", "Mona", "Nadia"
-    ]
-    arabic_last_names = [
-        "Alsaud", "Alotaibi", "Alharbi", "Alahmed", "Almutairi", "Alzahrani", 
-        "Alshammari", "Alqarni", "Almalki", "Alghamdi", "Almousa", "Alrashid", 
-        "Almazroa", "Alsharif", "Almuhanna", "Almawash", "Alshahrani", "Alqahtani", 
-        "Aldosari", "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori",
-        "Alhumaid", "Alsuwaidi", "Almazrouei", "Alshamsi", "Alnuaimi", "Aldhaheri",
-        "Alblushi", "Alhosani", "Almazmi", "Alshahwi", "Alhinai", "Alraisi",
-        "Alshukaili", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
-        "Alkhatib", "Alshehri", "Alshahwan", "Almajed", "Alharbi", "Aldosari",
-        "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid",
-        "Alsuwaidi", "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani",
-        "Alshahwan", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
-        "Alkhatib", "Alshehri", "Almajed", "Alharbi", "Aldosari", "Alhazmi",
-        "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid", "Alsuwaidi",
-        "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani", "Almazmi"
-    ]
-    
-    unique_last_names = list(dict.fromkeys(arabic_last_names))
-    is_female = cv_id % 2 == 0
-    first_names = arabic_female_names if is_female else arabic_male_names
-    first_idx = (cv_id * 3) % len(first_names)
-    last_idx = (cv_id * 5) % len(unique_last_names)
-    
-    return f"{first_names[first_idx]} {unique_last_names[last_idx]}"
+    first_names = _FEMALE if cv_id % 2 == 0 else _MALE
+    return f"{first_names[(cv_id * 3) % len(first_names)]} {_LAST[(cv_id * 5) % len(_LAST)]}"
+
+
+def load_cv_subset(cv_file: str, fmt: str) -> pd.DataFrame:
+    """
+    Read only the id / cv_summary / clean_cv columns, and only the CV_IDS rows.
+    Optional text columns that are absent from the file are skipped.
+    """
+    fmt = fmt.lower()
+    if fmt == "csv":
+        available = pd.read_csv(cv_file, nrows=0).columns
+    elif fmt == "parquet":
+        available = pq.read_schema(cv_file).names
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+    if CV_ID_COL not in available:
+        raise KeyError(CV_ID_COL)
+    columns = [c for c in (CV_ID_COL, "cv_summary", "clean_cv") if c in available]
+
+    if fmt == "parquet":
+        return pd.read_parquet(cv_file, columns=columns, filters=[(CV_ID_COL, "in", CV_IDS)])
+    tbl = pv.read_csv(
+        cv_file,
+        parse_options=pv.ParseOptions(newlines_in_values=True),   # summaries span several lines
+        convert_options=pv.ConvertOptions(include_columns=columns),
+    )
+    ids = pa.array(CV_IDS).cast(tbl.schema.field(CV_ID_COL).type)
+    return tbl.filter(pc.is_in(tbl[CV_ID_COL], value_set=ids)).to_pandas()
 
 
 def create_combined_pdf(candidates_data: list, output_path: Path):
@@ -177,14 +208,14 @@ def create_combined_pdf(candidates_data: list, output_path: Path):
             cv_summary_str = str(cv_summary).strip()
             # Try to format JSON nicely
             try:
-                cv_json = json.loads(cv_summary_str)
-                formatted_json = json.dumps(cv_json, indent=2, ensure_ascii=False)
+                cv_json = orjson.loads(cv_summary_str)
+                formatted_json = orjson.dumps(cv_json, option=orjson.OPT_INDENT_2).decode("utf-8")
                 # Escape HTML special characters for ReportLab
-                formatted_json = formatted_json.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                formatted_json = formatted_json.translate(_ESCAPE)
                 story.append(Paragraph(f"<font face='Courier' size='7'>{formatted_json}</font>", normal_style))
-            except json.JSONDecodeError:
+            except orjson.JSONDecodeError:
                 # If JSON is malformed, show raw text
-                cv_summary_escaped = cv_summary_str.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+                cv_summary_escaped = cv_summary_str.translate(_ESCAPE)
                 story.append(Paragraph(f"<font face='Courier' size='7'>{cv_summary_escaped}</font>", normal_style))
         else:
             story.append(Paragraph("No CV summary available", normal_style))
@@ -197,12 +228,12 @@ def create_combined_pdf(candidates_data: list, output_path: Path):
         if clean_cv and pd.notna(clean_cv):
             clean_cv_str = str(clean_cv).strip()
             # Escape HTML and break into paragraphs
-            clean_cv_escaped = clean_cv_str.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
-            # Split into sentences/paragraphs for better readability
+            clean_cv_escaped = clean_cv_str.translate(_ESCAPE)
+            # Split into lines, then emit them as one <br/>-joined Paragraph (one ReportLab parse per CV)
             paragraphs = clean_cv_escaped.split('\n')
-            for para in paragraphs[:50]:  # Limit to first 50 paragraphs to avoid huge PDFs
-                if para.strip():
-                    story.append(Paragraph(f"<font size='8'>{para.strip()}</font>", normal_style))
+            body = "<br/>".join(p.strip() for p in paragraphs[:50] if p.strip())  # Limit to first 50 paragraphs to avoid huge PDFs
+            if body:
+                story.append(Paragraph(f"<font size='8'>{body}</font>", normal_style))
             if len(paragraphs) > 50:
                 story.append(Paragraph(f"<i><font size='7'>... (truncated, {len(paragraphs) - 50} more paragraphs)</font></i>", normal_style))
         else:
@@ -238,48 +269,40 @@ def main():
     
     print(f"Loading CV data from: {cv_file}")
     
-    # Load CV data
-    if CV_FMT.lower() == "csv":
-        df = pd.read_csv(cv_file)
-    elif CV_FMT.lower() == "parquet":
-        df = pd.read_parquet(cv_file)
-    else:
-        raise ValueError(f"Unsupported format: {CV_FMT}")
-    
-    print(f"Loaded {len(df)} CVs")
-    print(f"Generating combined PDF for CV IDs: {CV_IDS}")
-    
-    # Filter for requested CV IDs
-    if CV_ID_COL not in df.columns:
+    # Load only the needed columns / rows
+    try:
+        df = load_cv_subset(cv_file, CV_FMT)
+    except KeyError:
         print(f"Error: Column '{CV_ID_COL}' not found in CSV")
         return
-    
-    # Collect data for all candidates
+
+    print(f"Loaded {len(df)} matching CVs")
+    print(f"Generating combined PDF for CV IDs: {CV_IDS}")
+
+    # Collect data for all candidates: one index lookup for all ids (first row wins on duplicate ids)
+    by_id = df.drop_duplicates(subset=[CV_ID_COL]).set_index(CV_ID_COL, drop=False)
+    wanted = pd.Index(CV_IDS)
+    found = wanted.isin(by_id.index)
+    for cv_id in wanted[~found]:
+        print(f"⚠ Skipping CV ID {cv_id}: Not found in dataset")
+
+    subset = by_id.loc[wanted[found]]
+    empty = pd.Series("", index=subset.index)
+    summaries = subset["cv_summary"] if "cv_summary" in subset.columns else empty
+    clean_cvs = subset["clean_cv"] if "clean_cv" in subset.columns else empty
+
     candidates_data = []
-    
-    for cv_id in CV_IDS:
-        cv_row = df[df[CV_ID_COL] == cv_id]
-        
-        if cv_row.empty:
-            print(f"⚠ Skipping CV ID {cv_id}: Not found in dataset")
-            continue
-        
-        r = cv_row.iloc[0]
-        
-        # Get all required data
+    for cv_id, cv_summary, clean_cv in zip(wanted[found].tolist(), summaries.tolist(), clean_cvs.tolist()):
         name = generate_candidate_name(cv_id)
-        cv_summary = r.get('cv_summary', '')
-        clean_cv = r.get('clean_cv', '')
-        
         candidates_data.append({
             "cv_id": cv_id,
             "name": name,
             "cv_summary": cv_summary if pd.notna(cv_summary) else "",
             "clean_cv": clean_cv if pd.notna(clean_cv) else "",
         })
-        
+
         print(f"✓ Collected data for CV ID {cv_id}: {name}")
-    
+
     if not candidates_data:
         print("Error: No candidate data collected")
         return
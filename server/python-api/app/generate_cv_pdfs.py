@@ -7,8 +7,10 @@ This script creates formatted PDFs that look like real resumes.
 import os
 import sys
 import re
-import json
+import string
+import orjson
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Dict, List, Optional, Tuple, Any
 from reportlab.lib.pagesizes import letter, A4
@@ -34,57 +36,73 @@ CV_IDS = [21, 29, 2, 152, 291]
 OUTPUT_DIR = Path(__file__).parent.parent.parent / "public" / "cvs" / "pdfs"
 OUTPUT_DIR.mkdir(parents=True, exist_ok=True)
 
+# Regexes compiled once at import
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b')
+_PHONE_RES = [re.compile(p) for p in (
+    r'\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}',
+    r'\d{3}[-.\s]?\d{3}[-.\s]?\d{4}',
+    r'\+966\s?\d{1,2}\s?\d{3}\s?\d{4}',
+)]
+_TRAILING_COMMA_OBJ_RE = re.compile(r',\s*}')
+_TRAILING_COMMA_ARR_RE = re.compile(r',\s*]')
+
+
+class _SlugTable(dict):
+    """str.translate table for filename slugs: lowercase, space -> '-', anything outside [a-z0-9-] dropped."""
+    def __missing__(self, key):
+        return None
+
+
+_SLUG_TABLE = _SlugTable({ord(c): c for c in string.ascii_lowercase + string.digits + "-"})
+_SLUG_TABLE.update({ord(c): c.lower() for c in string.ascii_uppercase})
+_SLUG_TABLE[ord(" ")] = "-"
+
+
+# Name tables for generate_candidate_name (built once at import)
+_MALE = (
+    "Saad", "Khalid", "Mohammed", "Ahmed", "Omar", "Yusuf", "Ibrahim", 
+    "Hassan", "Ali", "Faisal", "Sultan", "Nasser", "Majed", "Turki", "Bandar",
+    "Abdullah", "Fahad", "Saud", "Khalil", "Zaid", "Hamza", "Tariq", "Bader",
+    "Mansour", "Raed", "Waleed", "Fares", "Yazeed", "Khaled", "Saeed", "Nawaf",
+    "Mutaz", "Sami", "Hani", "Rami", "Fadi", "Tamer", "Yasser", "Bassam",
+    "Tarek", "Wael", "Ziyad", "Hatem", "Majid", "Nader", "Osama", "Karim"
+)
+_FEMALE = (
+    "Fatima", "Sara", "Noura", "Layla", "Amira", "Mariam", "Aisha", 
+    "Hala", "Rania", "Lina", "Dina", "Yasmin", "Reem", "Hanan", "Nada",
+    "Salma", "Rana", "Maya", "Leila", "Zeinab", "Hiba", "Rim", "Shaima",
+    "Maha", "Noor", "Rahaf", "Lama", "Rawan", "Dana", "Tala", "Raghad",
+    "Layan", "Jana", "Tara", "Yara", "Haya", "Nour", "Sana", "Hind",
+    "Amina", "Lubna", "Noora", "Farah", "Sanaa", "Huda", "Mona", "Nadia"
+)
+_LAST = tuple(dict.fromkeys([
+    "Alsaud", "Alotaibi", "Alharbi", "Alahmed", "Almutairi", "Alzahrani", 
+    "Alshammari", "Alqarni", "Almalki", "Alghamdi", "Almousa", "Alrashid", 
+    "Almazroa", "Alsharif", "Almuhanna", "Almawash", "Alshahrani", "Alqahtani", 
+    "Aldosari", "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori",
+    "Alhumaid", "Alsuwaidi", "Almazrouei", "Alshamsi", "Alnuaimi", "Aldhaheri",
+    "Alblushi", "Alhosani", "Almazmi", "Alshahwi", "Alhinai", "Alraisi",
+    "Alshukaili", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
+    "Alkhatib", "Alshehri", "Alshahwan", "Almajed", "Alharbi", "Aldosari",
+    "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid",
+    "Alsuwaidi", "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani",
+    "Alshahwan", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
+    "Alkhatib", "Alshehri", "Almajed", "Alharbi", "Aldosari", "Alhazmi",
+    "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid", "Alsuwaidi",
+    "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani", "Almazmi"
+]))  # deduplicated, first occurrence order
+
 
 def generate_candidate_name(cv_id: int) -> str:
     """
     Generate Arabic name in English letters based on cv_id.
     This matches the frontend name generation algorithm in client/src/lib/utils.ts
     """
-    arabic_male_names = [
-        "Saad", "Khalid", "Mohammed", "Ahmed", "Omar", "Yusuf", "Ibrahim", 
-        "Hassan", "Ali", "Faisal", "Sultan", "Nasser", "Majed", "Turki", "Bandar",
-        "Abdullah", "Fahad", "Saud", "Khalil", "Zaid", "Hamza", "Tariq", "Bader",
-        "Mansour", "Raed", "Waleed", "Fares", "Yazeed", "Khaled", "Saeed", "Nawaf",
-        "Mutaz", "Sami", "Hani", "Rami", "Fadi", "Tamer", "Yasser", "Bassam",
-        "Tarek", "Wael", "Ziyad", "Hatem", "Majid", "Nader", "Osama", "Karim"
-    ]
-    arabic_female_names = [
-        "Fatima", "Sara", "Noura", "Layla", "Amira", "Mariam", "Aisha", 
-        "Hala", "Rania", "Lina", "Dina", "Yasmin", "Reem", "Hanan", "Nada",
-        "Salma", "Rana", "Maya", "Leila", "Zeinab", "Hiba", "Rim", "Shaima",
-        "Maha", "Noor", "Rahaf", "Lama", "Rawan", "Dana", "Tala", "Raghad",
-        "Layan", "Jana", "Tara", "Yara", "Haya", "Nour", "Sana", "Hind",
-        "Amina", "Lubna", "Noora", "Farah", "Sanaa", "Huda", "Mona", "Nadia"
-    ]
-    arabic_last_names = [
-        "Alsaud", "Alotaibi", "Alharbi", "Alahmed", "Almutairi", "Alzahrani", 
-        "Alshammari", "Alqarni", "Almalki", "Alghamdi", "Almousa", "Alrashid", 
-        "Almazroa", "Alsharif", "Almuhanna", "Almawash", "Alshahrani", "Alqahtani", 
-        "Aldosari", "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori",
-        "Alhumaid", "Alsuwaidi", "Almazrouei", "Alshamsi", "Alnuaimi", "Aldhaheri",
-        "Alblushi", "Alhosani", "Almazmi", "Alshahwi", "Alhinai", "Alraisi",
-        "Alshukaili", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
-        "Alkhatib", "Alshehri", "Alshahwan", "Almajed", "Alharbi", "Aldosari",
-        "Alhazmi", "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid",
-        "Alsuwaidi", "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani",
-        "Alshahwan", "Almuhaimid", "Alhamdan", "Alshahri", "Almutawa", "Alshammasi",
-        "Alkhatib", "Alshehri", "Almajed", "Alharbi", "Aldosari", "Alhazmi",
-        "Alfahad", "Almubarak", "Alkhaldi", "Almansoori", "Alhumaid", "Alsuwaidi",
-        "Alshamsi", "Alnuaimi", "Aldhaheri", "Alblushi", "Alhosani", "Almazmi"
-    ]
-    
-    # Remove duplicates while preserving order
-    unique_last_names = list(dict.fromkeys(arabic_last_names))
-    
     # Alternate between male and female names (cv_id % 2 === 0 is female)
-    is_female = cv_id % 2 == 0
-    first_names = arabic_female_names if is_female else arabic_male_names
+    first_names = _FEMALE if cv_id % 2 == 0 else _MALE
     
     # Use same algorithm as frontend: (cv_id * 3) % len(first_names) and (cv_id * 5) % len(last_names)
-    first_idx = (cv_id * 3) % len(first_names)
-    last_idx = (cv_id * 5) % len(unique_last_names)
-    
-    return f"{first_names[first_idx]} {unique_last_names[last_idx]}"
+    return f"{first_names[(cv_id * 3) % len(first_names)]} {_LAST[(cv_id * 5) % len(_LAST)]}"
 
 
 def parse_cv_summary_json(cv_summary: str, cv_id: int, clean_cv: str = "", normalized_cv: str = "") -> Dict[str, Any]:
@@ -115,25 +133,19 @@ def parse_cv_summary_json(cv_summary: str, cv_id: int, clean_cv: str = "", norma
         "certifications": [],
     }
     
-    # Try to extract contact info from clean_cv or normalized_cv
-    contact_text = (clean_cv or normalized_cv or "").strip()
+    # Try to extract contact info from the header block of clean_cv or normalized_cv
+    contact_text = (clean_cv or normalized_cv or "")[:800].strip()
     if contact_text:
-        # Extract email
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,}\b'
-        emails = re.findall(email_pattern, contact_text)
-        if emails:
-            result["email"] = emails[0]
+        # Extract email (first match only)
+        email = _EMAIL_RE.search(contact_text)
+        if email:
+            result["email"] = email.group(0)
         
-        # Extract phone
-        phone_patterns = [
-            r'\+?\d{1,3}[-.\s]?\(?\d{1,4}\)?[-.\s]?\d{1,4}[-.\s]?\d{1,9}',
-            r'\d{3}[-.\s]?\d{3}[-.\s]?\d{4}',
-            r'\+966\s?\d{1,2}\s?\d{3}\s?\d{4}',
-        ]
-        for pattern in phone_patterns:
-            phones = re.findall(pattern, contact_text)
-            if phones:
-                result["phone"] = phones[0]
+        # Extract phone: first pattern that matches anywhere
+        for pattern in _PHONE_RES:
+            phone = pattern.search(contact_text)
+            if phone:
+                result["phone"] = phone.group(0)
                 break
     
     # Parse JSON from cv_summary
@@ -141,11 +153,11 @@ def parse_cv_summary_json(cv_summary: str, cv_id: int, clean_cv: str = "", norma
         return result
     
     cv_summary_str = str(cv_summary).strip()
-    if not cv_summary_str.startswith('{'):
+    if not (cv_summary_str.startswith('{') and cv_summary_str.endswith('}')):
         return result
     
     try:
-        cv_json = json.loads(cv_summary_str)
+        cv_json = orjson.loads(cv_summary_str)
         
         # Extract all sections from JSON
         result["title"] = cv_json.get("title", "")
@@ -176,14 +188,15 @@ def parse_cv_summary_json(cv_summary: str, cv_id: int, clean_cv: str = "", norma
         if isinstance(cv_json.get("experience"), list):
             result["work_experience"] = cv_json["experience"]
         
-    except json.JSONDecodeError as e:
+    except orjson.JSONDecodeError as e:   # subclass of json.JSONDecodeError
         print(f"Warning: Failed to parse JSON from cv_summary: {e}")
-        # Try to fix common JSON issues
+        # Remove trailing commas; re-parse only if there were any to remove
+        fixed_json, n_obj = _TRAILING_COMMA_OBJ_RE.subn('}', cv_summary_str)
+        fixed_json, n_arr = _TRAILING_COMMA_ARR_RE.subn(']', fixed_json)
+        if not (n_obj or n_arr):
+            return result
         try:
-            # Remove trailing commas or other issues
-            fixed_json = re.sub(r',\s*}', '}', cv_summary_str)
-            fixed_json = re.sub(r',\s*]', ']', fixed_json)
-            cv_json = json.loads(fixed_json)
+            cv_json = orjson.loads(fixed_json)
             # Apply same extraction logic as above
             result["title"] = cv_json.get("title", "")
             result["years_experience"] = cv_json.get("years_experience")
@@ -203,26 +216,10 @@ def parse_cv_summary_json(cv_summary: str, cv_id: int, clean_cv: str = "", norma
     return result
 
 
-def create_pdf(cv_id: int, cv_data: Dict, output_path: Path):
-    """
-    Create a professional black and white PDF resume.
-    """
-    doc = SimpleDocTemplate(
-        str(output_path),
-        pagesize=letter,
-        rightMargin=0.75*inch,
-        leftMargin=0.75*inch,
-        topMargin=0.75*inch,
-        bottomMargin=0.75*inch
-    )
-    
-    # Container for the 'Flowable' objects
-    story = []
-    
-    # Define styles
+def _build_styles() -> Dict[str, ParagraphStyle]:
+    """Resume paragraph styles; built once at import and shared by every PDF."""
     styles = getSampleStyleSheet()
     
-    # Custom styles for professional resume
     title_style = ParagraphStyle(
         'CustomTitle',
         parent=styles['Heading1'],
@@ -285,19 +282,39 @@ def create_pdf(cv_id: int, cv_data: Dict, output_path: Path):
         spaceAfter=4,
         fontName='Helvetica'
     )
+    return {
+        "title": title_style,
+        "subtitle": subtitle_style,
+        "contact": contact_style,
+        "section": section_style,
+        "normal": normal_style,
+        "bullet": bullet_style,
+    }
+
+
+_STYLES = _build_styles()
+
+
+def _flowables(cv_id: int, cv_data: Dict):
+    """
+    Yield the resume's flowables in page order.
+    """
+    # Shared module-level styles
+    title_style, subtitle_style, contact_style = _STYLES["title"], _STYLES["subtitle"], _STYLES["contact"]
+    section_style, normal_style, bullet_style = _STYLES["section"], _STYLES["normal"], _STYLES["bullet"]
     
     # Header: Name
     name = cv_data.get("name", f"Candidate {cv_id}").strip()
     if not name or name == "":
         name = f"Candidate {cv_id}"
     
-    story.append(Paragraph(name.upper(), title_style))
-    story.append(Spacer(1, 0.1*inch))
+    yield Paragraph(name.upper(), title_style)
+    yield Spacer(1, 0.1*inch)
     
     # Title/Position
     title = cv_data.get("title", "")
     if title:
-        story.append(Paragraph(title, subtitle_style))
+        yield Paragraph(title, subtitle_style)
     
     # Contact Information
     contact_info = []
@@ -310,37 +327,37 @@ def create_pdf(cv_id: int, cv_data: Dict, output_path: Path):
     
     if contact_info:
         contact_text = " | ".join(contact_info)
-        story.append(Paragraph(contact_text, contact_style))
+        yield Paragraph(contact_text, contact_style)
     
-    story.append(Spacer(1, 0.2*inch))
+    yield Spacer(1, 0.2*inch)
     
     # Years of Experience (if available)
     years_exp = cv_data.get("years_experience")
     if years_exp:
         exp_text = f"{years_exp} years of experience" if isinstance(years_exp, (int, float)) else str(years_exp)
-        story.append(Paragraph(exp_text, normal_style))
-        story.append(Spacer(1, 0.15*inch))
+        yield Paragraph(exp_text, normal_style)
+        yield Spacer(1, 0.15*inch)
     
     # Key Skills
     if cv_data.get("key_skills"):
-        story.append(Paragraph("KEY SKILLS", section_style))
+        yield Paragraph("KEY SKILLS", section_style)
         skills = cv_data["key_skills"]
         # Format skills in a readable way (3-4 per line)
         skills_text = " • ".join(skills[:20])  # Limit to 20 skills
-        story.append(Paragraph(skills_text, normal_style))
-        story.append(Spacer(1, 0.15*inch))
+        yield Paragraph(skills_text, normal_style)
+        yield Spacer(1, 0.15*inch)
     
     # Tools & Software
     if cv_data.get("tools_software"):
-        story.append(Paragraph("TOOLS & SOFTWARE", section_style))
+        yield Paragraph("TOOLS & SOFTWARE", section_style)
         tools = cv_data["tools_software"]
         tools_text = " • ".join(tools)
-        story.append(Paragraph(tools_text, normal_style))
-        story.append(Spacer(1, 0.15*inch))
+        yield Paragraph(tools_text, normal_style)
+        yield Spacer(1, 0.15*inch)
     
     # Work Experience
     if cv_data.get("work_experience"):
-        story.append(Paragraph("PROFESSIONAL EXPERIENCE", section_style))
+        yield Paragraph("PROFESSIONAL EXPERIENCE", section_style)
         for exp in cv_data["work_experience"][:5]:  # Limit to 5 experiences
             if isinstance(exp, dict):
                 exp_text = f"<b>{exp.get('title', exp.get('position', 'Position'))}</b>"
@@ -348,56 +365,81 @@ def create_pdf(cv_id: int, cv_data: Dict, output_path: Path):
                     exp_text += f" | {exp['company']}"
                 if exp.get('period') or exp.get('duration'):
                     exp_text += f" | {exp.get('period', exp.get('duration', ''))}"
-                story.append(Paragraph(exp_text, normal_style))
+                yield Paragraph(exp_text, normal_style)
                 if exp.get('description'):
                     desc = exp['description'][:200] + "..." if len(exp['description']) > 200 else exp['description']
-                    story.append(Paragraph(desc, bullet_style))
+                    yield Paragraph(desc, bullet_style)
             elif isinstance(exp, str):
-                story.append(Paragraph(f"• {exp}", bullet_style))
-            story.append(Spacer(1, 0.1*inch))
-        story.append(Spacer(1, 0.15*inch))
+                yield Paragraph(f"• {exp}", bullet_style)
+            yield Spacer(1, 0.1*inch)
+        yield Spacer(1, 0.15*inch)
     
     # Education
     if cv_data.get("education"):
-        story.append(Paragraph("EDUCATION", section_style))
+        yield Paragraph("EDUCATION", section_style)
         for edu in cv_data["education"]:
             if isinstance(edu, str):
-                story.append(Paragraph(f"• {edu}", bullet_style))
+                yield Paragraph(f"• {edu}", bullet_style)
             elif isinstance(edu, dict):
                 edu_text = edu.get("degree", edu.get("title", ""))
                 if edu.get("school"):
                     edu_text += f" - {edu['school']}"
                 if edu.get("year"):
                     edu_text += f" ({edu['year']})"
-                story.append(Paragraph(f"• {edu_text}", bullet_style))
-        story.append(Spacer(1, 0.15*inch))
+                yield Paragraph(f"• {edu_text}", bullet_style)
+        yield Spacer(1, 0.15*inch)
     
     # Achievements
     if cv_data.get("achievements"):
-        story.append(Paragraph("KEY ACHIEVEMENTS", section_style))
+        yield Paragraph("KEY ACHIEVEMENTS", section_style)
         for achievement in cv_data["achievements"][:8]:  # Limit to 8 achievements
-            story.append(Paragraph(f"• {achievement}", bullet_style))
-        story.append(Spacer(1, 0.15*inch))
+            yield Paragraph(f"• {achievement}", bullet_style)
+        yield Spacer(1, 0.15*inch)
     
     # Strengths
     if cv_data.get("strengths"):
-        story.append(Paragraph("KEY STRENGTHS", section_style))
+        yield Paragraph("KEY STRENGTHS", section_style)
         strengths_text = " • ".join(cv_data["strengths"][:10])  # Limit to 10 strengths
-        story.append(Paragraph(strengths_text, normal_style))
-        story.append(Spacer(1, 0.15*inch))
+        yield Paragraph(strengths_text, normal_style)
+        yield Spacer(1, 0.15*inch)
     
     # Certifications
     if cv_data.get("certifications"):
-        story.append(Paragraph("CERTIFICATIONS & QUALIFICATIONS", section_style))
+        yield Paragraph("CERTIFICATIONS & QUALIFICATIONS", section_style)
         for cert in cv_data["certifications"][:6]:  # Limit to 6 certifications
-            story.append(Paragraph(f"• {cert}", bullet_style))
-        story.append(Spacer(1, 0.15*inch))
+            yield Paragraph(f"• {cert}", bullet_style)
+        yield Spacer(1, 0.15*inch)
+
+
+def create_pdf(cv_id: int, cv_data: Dict, output_path: Path):
+    """
+    Create a professional black and white PDF resume.
+    """
+    doc = SimpleDocTemplate(
+        str(output_path),
+        pagesize=letter,
+        rightMargin=0.75*inch,
+        leftMargin=0.75*inch,
+        topMargin=0.75*inch,
+        bottomMargin=0.75*inch
+    )
     
-    # Build PDF
-    doc.build(story)
+    # Build PDF (platypus pops from the story as it lays out, so it needs a list)
+    doc.build(list(_flowables(cv_id, cv_data)))
     print(f"✓ Generated PDF for CV ID {cv_id}: {output_path}")
 
 
+def _render(task: Tuple[int, Dict, Path]):
+    """Worker entry point: create one PDF, reporting (not raising) failures."""
+    cv_id, cv_data, output_path = task
+    try:
+        create_pdf(cv_id, cv_data, output_path)
+    except Exception as e:
+        print(f"✗ Error generating PDF for CV ID {cv_id}: {e}")
+        import traceback
+        traceback.print_exc()
+
+
 def main():
     """Main function to generate PDFs for specified CV IDs."""
     # Try multiple possible paths
@@ -435,32 +477,31 @@ def main():
         print(f"Error: Column '{CV_ID_COL}' not found in CSV")
         return
     
-    filtered_df = df[df[CV_ID_COL].isin(CV_IDS)]
+    # One isin pass, keyed by id (first row wins on duplicate ids)
+    filtered_df = df[df[CV_ID_COL].isin(CV_IDS)].drop_duplicates(CV_ID_COL).set_index(CV_ID_COL)
     
     if len(filtered_df) < len(CV_IDS):
-        found_ids = set(filtered_df[CV_ID_COL].tolist())
-        missing_ids = set(CV_IDS) - found_ids
+        missing_ids = set(CV_IDS) - set(filtered_df.index)
         print(f"Warning: Some CV IDs not found: {missing_ids}")
     
-    # Generate PDF for each CV
+    # Parse each CV, then render the PDFs in parallel
+    tasks = []
     for cv_id in CV_IDS:
-        cv_row = df[df[CV_ID_COL] == cv_id]
-        
-        if cv_row.empty:
+        if cv_id not in filtered_df.index:
             print(f"⚠ Skipping CV ID {cv_id}: Not found in dataset")
             continue
         
-        # Get CV data from different columns
+        # Get CV data from different columns (scalar .at lookups)
         cv_summary = None
         clean_cv = None
         normalized_cv = None
         
-        if 'cv_summary' in cv_row.columns:
-            cv_summary = cv_row['cv_summary'].iloc[0]
-        if 'clean_cv' in cv_row.columns:
-            clean_cv = cv_row['clean_cv'].iloc[0]
-        if 'normalized_cv' in cv_row.columns:
-            normalized_cv = cv_row['normalized_cv'].iloc[0]
+        if 'cv_summary' in filtered_df.columns:
+            cv_summary = filtered_df.at[cv_id, 'cv_summary']
+        if 'clean_cv' in filtered_df.columns:
+            clean_cv = filtered_df.at[cv_id, 'clean_cv']
+        if 'normalized_cv' in filtered_df.columns:
+            normalized_cv = filtered_df.at[cv_id, 'normalized_cv']
         
         if not cv_summary or pd.isna(cv_summary):
             print(f"⚠ Skipping CV ID {cv_id}: No cv_summary available")
@@ -477,20 +518,17 @@ def main():
         cv_data["cv_id"] = cv_id
         
         # Generate PDF filename
-        name_slug = cv_data.get("name", f"candidate_{cv_id}").lower().replace(" ", "-")
-        name_slug = re.sub(r'[^a-z0-9\-]', '', name_slug)
+        name_slug = cv_data.get("name", f"candidate_{cv_id}").translate(_SLUG_TABLE)
         if not name_slug:
             name_slug = f"candidate_{cv_id}"
         
         output_path = OUTPUT_DIR / f"{name_slug}_cv_{cv_id}.pdf"
-        
-        # Create PDF
-        try:
-            create_pdf(cv_id, cv_data, output_path)
-        except Exception as e:
-            print(f"✗ Error generating PDF for CV ID {cv_id}: {e}")
-            import traceback
-            traceback.print_exc()
+        tasks.append((cv_id, cv_data, output_path))
+    
+    # ReportLab layout is CPU-bound and holds the GIL: render in processes
+    if tasks:
+        with ProcessPoolExecutor(max_workers=min(len(tasks), os.cpu_count() or 1)) as ex:
+            list(ex.map(_render, tasks))
     
     print(f"\n✓ PDF generation complete! Files saved to: {OUTPUT_DIR}")
 
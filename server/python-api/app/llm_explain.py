@@ -1,32 +1,67 @@
 # server/python-api/app/llm_explain.py
 from __future__ import annotations
-import os, json
-from typing import Any, Dict, List, Optional, Tuple
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import asyncio, logging, os, threading
+import orjson
+from typing import Any, Dict, List, Optional
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI, AzureOpenAI
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # --- Azure OpenAI config ---
 API_VERSION = os.getenv("AZURE_OPENAI_API_VERSION", "2024-08-01-preview")
 AZURE_OPENAI_ENDPOINT = os.getenv("AZURE_OPENAI_ENDPOINT")
 AZURE_OPENAI_API_KEY = os.getenv("AZURE_OPENAI_API_KEY")
 DEFAULT_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
 
-# Create client per thread to avoid contention (thread-local storage would be better but this works)
-def _client() -> AzureOpenAI:
-    """Create a new Azure OpenAI client (one per thread for better parallelism)."""
+def _client_kwargs() -> Dict[str, Any]:
     if not AZURE_OPENAI_ENDPOINT or not AZURE_OPENAI_API_KEY:
         raise RuntimeError("Set AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_API_KEY")
-    return AzureOpenAI(
+    return dict(
         api_key=AZURE_OPENAI_API_KEY,
         azure_endpoint=AZURE_OPENAI_ENDPOINT,
         api_version=API_VERSION,
         timeout=60.0,  # Increased timeout to handle slow responses (60 seconds)
     )
 
+# One client for the process: it is thread-safe, and its httpx pool keeps connections alive across requests.
+_CLIENT: Optional[AzureOpenAI] = None
+_CLIENT_LOCK = threading.Lock()
+
+def _client() -> AzureOpenAI:
+    """Shared Azure OpenAI client, created on first use."""
+    global _CLIENT
+    if _CLIENT is None:
+        with _CLIENT_LOCK:
+            if _CLIENT is None:
+                _CLIENT = AzureOpenAI(**_client_kwargs())
+    return _CLIENT
+
+# Batch explanations run as coroutines on one background event loop. An async httpx pool is bound to the
+# loop that created it, so the loop (and the async client on it) lives for the whole process.
+_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_ASYNC_CLIENT: Optional[AsyncAzureOpenAI] = None
+
+def _explain_loop() -> asyncio.AbstractEventLoop:
+    global _LOOP
+    if _LOOP is None:
+        with _CLIENT_LOCK:
+            if _LOOP is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="llm-explain", daemon=True).start()
+                _LOOP = loop
+    return _LOOP
+
+def _async_client() -> AsyncAzureOpenAI:
+    """Shared async client; only touched from coroutines on _explain_loop()."""
+    global _ASYNC_CLIENT
+    if _ASYNC_CLIENT is None:
+        _ASYNC_CLIENT = AsyncAzureOpenAI(**_client_kwargs())
+    return _ASYNC_CLIENT
+
 def _deployment_name(req_like: Any) -> str:
     """Use req_like.llm_model if present, else fallback to DEFAULT_DEPLOYMENT."""
     return getattr(req_like, "llm_model", None) or DEFAULT_DEPLOYMENT
@@ -60,6 +95,36 @@ USER_TEMPLATE = (
     "- Reasons should cite concrete overlaps (skills, tools, years/education).\n"
 )
 
+# Built once so every request opens with byte-identical system tokens (Azure prompt-cache prefix)
+_SYSTEM_MSG_OBJ = {"role": "system", "content": SYSTEM_MSG}
+
+# USER_TEMPLATE split at the CV: the JD part is formatted once per batch, the tail is constant
+_USER_HEAD, _USER_TAIL = USER_TEMPLATE.split("{cv}")
+_USER_TAIL = _USER_TAIL.format()
+
+def _char_budget(per_cv_char_budget: int) -> int:
+    # Reduce input size for faster tokenization and processing
+    return min(per_cv_char_budget, 2500)
+
+def _jd_head(jd_text: str, per_cv_char_budget: int) -> str:
+    """User-message text up to the CV, with the trimmed JD filled in."""
+    return _USER_HEAD.format(jd=jd_text[:_char_budget(per_cv_char_budget)])
+
+def _messages(jd_head: str, cv_text: str, per_cv_char_budget: int) -> List[Dict[str, str]]:
+    return [
+        _SYSTEM_MSG_OBJ,
+        {"role": "user", "content": jd_head + cv_text[:_char_budget(per_cv_char_budget)] + _USER_TAIL},
+    ]
+
+def _parse_reply(resp: Any, max_reasons: int) -> Dict[str, Any]:
+    # A truncated reply still fails here; explain_matches records that as {"error": ...}
+    data = orjson.loads(resp.choices[0].message.content or "")
+    # The LLM should always return "reasons" key based on our prompt
+    # But we'll validate and limit the reasons list
+    if isinstance(data, dict) and "reasons" in data and isinstance(data["reasons"], list):
+        data["reasons"] = data["reasons"][:max_reasons]
+    return data
+
 def explain_one(
     req_like: Any,
     jd_text: str,
@@ -72,111 +137,95 @@ def explain_one(
     
     Optimized for speed:
     - Reduced input size (2500 chars) for faster processing
-    - Separate client per thread to avoid contention
+    - Shared client, so concurrent calls reuse pooled connections
     """
-    # Reduce input size for faster tokenization and processing
-    optimized_budget = min(per_cv_char_budget, 2500)
-    jd_trim = jd_text[:optimized_budget]
-    cv_trim = cv_text[:optimized_budget]
-
-    messages = [
-        {"role": "system", "content": SYSTEM_MSG},
-        {"role": "user", "content": USER_TEMPLATE.format(jd=jd_trim, cv=cv_trim)},
-    ]
-
-    client = _client()
-    resp = client.chat.completions.create(
+    resp = _client().chat.completions.create(
         model=_deployment_name(req_like),
-        messages=messages,
+        messages=_messages(_jd_head(jd_text, per_cv_char_budget), cv_text, per_cv_char_budget),
+        response_format={"type": "json_object"},  # JSON mode: the reply always parses
     )
+    return _parse_reply(resp, max_reasons)
 
-    txt = resp.choices[0].message.content or ""
-    try:
-        data = json.loads(txt)
-        # The LLM should always return "reasons" key based on our prompt
-        # But we'll validate and limit the reasons list
-        if isinstance(data, dict) and "reasons" in data and isinstance(data["reasons"], list):
-            data["reasons"] = data["reasons"][:max_reasons]
-        return data
-    except Exception:
-        return {"raw": txt}
+async def explain_one_async(
+    req_like: Any,
+    jd_text: str,
+    cv_text: str,
+    cv_uid: Optional[int] = None,
+    max_reasons: int = 4,
+    per_cv_char_budget: int = 4000,
+    jd_head: Optional[str] = None,
+) -> Dict[str, Any]:
+    """explain_one on the shared async client; must run on _explain_loop().
+    jd_head: precomputed _jd_head(jd_text, per_cv_char_budget), shared across a batch."""
+    if jd_head is None:
+        jd_head = _jd_head(jd_text, per_cv_char_budget)
+    resp = await _async_client().chat.completions.create(
+        model=_deployment_name(req_like),
+        messages=_messages(jd_head, cv_text, per_cv_char_budget),
+        response_format={"type": "json_object"},  # JSON mode: the reply always parses
+    )
+    return _parse_reply(resp, max_reasons)
 
-def explain_matches(req_like: Any, ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+async def explain_matches_async(req_like: Any, ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """Add an 'explanation' field for each item in ranked results.
     
-    Uses parallel processing to generate explanations concurrently for better performance.
+    All LLM calls are in flight at once as coroutines on the explain loop; awaiting this from
+    another event loop hands the work over to it.
     
     IMPORTANT: The 'ranked' parameter MUST be the top 5 candidates in rank order (1, 2, 3, 4, 5).
     The function preserves the exact order - explanations are generated for candidates in the
     same order they are received, and returned in the same order.
     """
+    loop = _explain_loop()
+    if asyncio.get_running_loop() is not loop:
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(explain_matches_async(req_like, ranked), loop))
+    
     jd_text = getattr(req_like, "jd_text", "")
     max_reasons = getattr(req_like, "max_reasons", 4)
     per_cv_char_budget = getattr(req_like, "per_cv_char_budget", 4000)
     
-    # Log to verify we're processing the correct candidates
-    if ranked:
+    # Log to verify we're processing the correct candidates (debug only; lists are built only if enabled)
+    debug = ranked and logger.isEnabledFor(logging.DEBUG)
+    if debug:
         ranks = [item.get("rank") for item in ranked if item.get("rank")]
         cv_uids = [item.get("cv_uid") for item in ranked if item.get("cv_uid")]
-        print(f"[EXPLAIN_MATCHES] Processing {len(ranked)} candidates")
-        print(f"[EXPLAIN_MATCHES] Ranks: {ranks}")
-        print(f"[EXPLAIN_MATCHES] CV UIDs: {cv_uids}")
+        logger.debug("[EXPLAIN_MATCHES] Processing %d candidates", len(ranked))
+        logger.debug("[EXPLAIN_MATCHES] Ranks: %s", ranks)
+        logger.debug("[EXPLAIN_MATCHES] CV UIDs: %s", cv_uids)
     
-    # Prepare all items with their CV text
-    # idx preserves the original order (0, 1, 2, 3, 4 for top 5)
-    items_with_cv: List[Tuple[int, Dict[str, Any], str]] = []
-    for idx, item in enumerate(ranked):
-        cv_text = item.get("cv_text") or item.get("cv_summary") or item.get("clean_cv_full") or ""
-        items_with_cv.append((idx, item, cv_text))
+    # JD trimmed and formatted once; every request in the batch shares this prefix
+    jd_head = _jd_head(jd_text, per_cv_char_budget)
     
-    # Function to explain a single item (for parallel execution)
-    def explain_item_wrapper(args: Tuple[int, Dict[str, Any], str]) -> Tuple[int, Dict[str, Any]]:
-        idx, item, cv_text = args
+    # Explain a single item; failures become an error explanation instead of failing the batch
+    async def explain_item(cv_text: str, cv_uid: Optional[int]) -> Dict[str, Any]:
         try:
-            exp = explain_one(
+            exp = await explain_one_async(
                 req_like=req_like,
                 jd_text=jd_text,
                 cv_text=cv_text,
-                cv_uid=item.get("cv_uid"),
+                cv_uid=cv_uid,
                 max_reasons=max_reasons,
                 per_cv_char_budget=per_cv_char_budget,
+                jd_head=jd_head,
             )
         except Exception as e:
             exp = {"error": str(e)}
-        enriched = dict(item)
-        enriched["explanation"] = exp
-        return (idx, enriched)
-    
-    # Execute all explanations in parallel
-    # Use ThreadPoolExecutor for I/O-bound operations (HTTP requests)
-    # Increased max_workers for better parallelism (Azure OpenAI can handle many concurrent requests)
-    explanations: Dict[int, Dict[str, Any]] = {}
-    # Use more workers - Azure OpenAI can handle many concurrent requests
-    max_workers = min(len(ranked), 20)  # Increased to 20 for maximum parallelism
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        # Submit all tasks
-        future_to_idx = {executor.submit(explain_item_wrapper, args): args[0] for args in items_with_cv}
-        
-        # Collect results as they complete
-        for future in as_completed(future_to_idx):
-            try:
-                idx, enriched = future.result()
-                explanations[idx] = enriched
-            except Exception as e:
-                # If a task fails, use the original item with an error explanation
-                idx = future_to_idx[future]
-                original_item = ranked[idx]
-                enriched = dict(original_item)
-                enriched["explanation"] = {"error": f"Failed to generate explanation: {str(e)}"}
-                explanations[idx] = enriched
+        return exp
     
-    # Reconstruct output in original order - CRITICAL: This preserves the rank order
-    # explanations dict uses idx (0,1,2,3,4) as keys, so we reconstruct in that order
-    out: List[Dict[str, Any]] = [explanations[i] for i in range(len(ranked))]
+    # Tasks get only the CV text they send and the uid, not the ranked item
+    cv_texts = [item.get("cv_text") or item.get("cv_summary") or item.get("clean_cv_full") or "" for item in ranked]
+    # gather returns results in argument order - CRITICAL: This preserves the rank order
+    exps = await asyncio.gather(*(explain_item(t, item.get("cv_uid")) for t, item in zip(cv_texts, ranked)))
+    # Merge once all replies are in; in-flight tasks hold only their explanation, not a copy of the item
+    out: List[Dict[str, Any]] = [{**item, "explanation": exp} for item, exp in zip(ranked, exps)]
     
     # Verify order is preserved
-    if out:
+    if debug:
         output_ranks = [item.get("rank") for item in out if item.get("rank")]
-        print(f"[EXPLAIN_MATCHES] Output order verified - Ranks: {output_ranks}")
+        logger.debug("[EXPLAIN_MATCHES] Output order verified - Ranks: %s", output_ranks)
     
     return out
+
+def explain_matches(req_like: Any, ranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Blocking wrapper around explain_matches_async for sync callers (the API endpoints)."""
+    return asyncio.run_coroutine_threadsafe(explain_matches_async(req_like, ranked), _explain_loop()).result()
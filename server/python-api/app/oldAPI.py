@@ -14,10 +14,10 @@ import os
 from types import SimpleNamespace
 from dotenv import load_dotenv
 
-from .engine import get_engine
-from .reranker import rerank_pairs
+from .engine import get_engine, prebuild_engines, topk_desc
+from .reranker import MULTI_GPU_POOL, rerank_topk
 from .reranker_mp import rerank_pairs_multi
-from .config import THRESHOLD, RRF_K, POOL  # only knobs/paths; NOT column choices
+from .config import THRESHOLD, RRF_K, POOL, PREBUILD_COLS  # only knobs/paths; NOT column choices
 from .llm_explain import explain_matches
 
 load_dotenv()
@@ -26,6 +26,9 @@ LLM_MODEL_DEFAULT = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
 EXPLAIN_MAX_REASONS = int(os.getenv("EXPLAIN_MAX_REASONS", "4"))
 EXPLAIN_CHAR_BUDGET = int(os.getenv("EXPLAIN_CHAR_BUDGET", "4000"))
 
+# probed once: the CUDA driver queries are not free on every request
+_CUDA_DEVICES = [f"cuda:{i}" for i in range(torch.cuda.device_count())] if torch.cuda.is_available() else []
+
 app = FastAPI()
 app.add_middleware(
     CORSMiddleware,
@@ -37,15 +40,11 @@ app.add_middleware(
 
 # ---------- helpers ----------
 def _resolve_to_other_col(eng, jd_clean_text: str, target_col: Optional[str]) -> str:
-    """If target_col is provided and exists in eng.jd, try exact-match lookup from eng.jd_col -> target_col."""
+    """If target_col is provided and exists in eng.jd, exact-match lookup eng.jd_col -> target_col (eng.resolve_map)."""
     if not target_col or target_col not in eng.jd.columns or eng.jd_col not in eng.jd.columns:
         return str(jd_clean_text)
-    mask = eng.jd[eng.jd_col].astype(str) == str(jd_clean_text)
-    if mask.any():
-        cand = eng.jd.loc[mask, target_col].astype(str)
-        if not cand.empty:
-            return cand.iloc[cand.str.len().argmax()]
-    return str(jd_clean_text)
+    jd_clean_text = str(jd_clean_text)
+    return eng.resolve_map(target_col).get(jd_clean_text, jd_clean_text)
 
 def _pick_cv_text(item: dict, prefer_col: str) -> str:
     """Pick what to feed to CE from item given a preferred logical label: 'summary' or 'clean' or 'retrieval'."""
@@ -139,6 +138,11 @@ class MatchRes(BaseModel):
 
 # ---------- endpoints ----------    explanation: Optional[dict] = None
 
+@app.on_event("startup")
+def _prebuild():
+    # warm the column combinations production actually queries (PREBUILD_COLS), with the request-default extras
+    prebuild_engines(PREBUILD_COLS, extra_cv_cols={"summary": "cv_summary", "clean": "clean_cv"})
+
 @app.get("/health")
 def health():
     # Build a default engine just to verify everything loads (columns arbitrary here)
@@ -188,13 +192,14 @@ def match(req: MatchReq):
     jd_query = _resolve_to_other_col(eng, req.jd_text, req.resolve_jd_to_col)
     all_k = eng.N_UNIQ
     # 1) retrieve a large pool
-    cands = eng.retrieve(
+    cands, arrs = eng.retrieve(
         jd_text=jd_query,
         k=req.candidate_topk,
         pool=all_k,
         rrf_k=req.rrf_k,
         threshold=req.threshold,
         cosine_floor=req.cosine_floor,
+        return_arrays=True,
     )
     if not cands:
         return []
@@ -203,43 +208,51 @@ def match(req: MatchReq):
 
     # 2) CE text for CV
     cv_texts = [_pick_cv_text(c, req.cv_text_for_ce) for c in cands]
-    priors   = [float(c.get("hybrid_score_0_100", 0.0)) / 100.0 for c in cands]
-    pairs    = [(jd_query, t) for t in cv_texts]
+    priors   = arrs["hybrid_0_100"] / 100.0   # fresh array: clipped in place below
      # <-- exact text fed to CE for this candidate
-    # 3) run CE (use multi-GPU if available)
-    if torch.cuda.is_available() and torch.cuda.device_count() > 1:
-        devices = [f"cuda:{i}" for i in range(torch.cuda.device_count())]
-        scores = rerank_pairs_multi(pairs, batch_size=req.batch_size, devices=devices)
+    # 3) run CE (use multi-GPU if available); alpha == 0 ranks on the prior alone, so CE is skipped
+    if req.alpha != 0.0 and not MULTI_GPU_POOL:
+        # CE, blend and top-k stay on the reranker's device; only the k winners come back to the host
+        top_final, order, top_ce = rerank_topk(
+            [(jd_query, t) for t in cv_texts], priors, req.alpha, req.topk, batch_size=req.batch_size,
+        )
     else:
-        scores = rerank_pairs(pairs, batch_size=req.batch_size)
-
-    # 4) blend CE with prior
-    lo, hi = float(scores.min()), float(scores.max())
-    ce_norm = (scores - lo) / (hi - lo) if hi > lo else (scores * 0 + 1.0)
-    pri     = np.clip(np.asarray(priors, dtype=float), 0.0, 1.0)
-    final   = req.alpha * ce_norm + (1.0 - req.alpha) * pri
-
-    order = np.argsort(-final)[:req.topk]
-
-    out: List[MatchRes] = []
-    for rnk, i in enumerate(order, start=1):
+        if req.alpha == 0.0:
+            scores = np.zeros(len(cands))
+        else:
+            scores = rerank_pairs_multi([(jd_query, t) for t in cv_texts], batch_size=req.batch_size, devices=_CUDA_DEVICES)
+
+        # 4) blend CE with prior
+        lo, hi = float(scores.min()), float(scores.max())
+        final   = np.subtract(scores, lo, dtype=float)
+        if hi > lo:
+            final *= req.alpha / (hi - lo)           # alpha * min-max(CE), in place
+        else:
+            final.fill(req.alpha)
+        np.clip(priors, 0.0, 1.0, out=priors)
+        final  += (1.0 - req.alpha) * priors
+
+        order = topk_desc(final, req.topk)
+        top_final, top_ce = final[order], scores[order]
+
+    # plain dicts: response_model validates them once on the way out, and the explainer enriches them as-is
+    out: List[Dict[str, Any]] = []
+    for rnk, (i, f, ce) in enumerate(zip(order.tolist(), top_final.tolist(), top_ce.tolist()), start=1):
         item = cands[i]
         ce_cv_text = cv_texts[i] 
-        out.append(MatchRes(
-            rank=rnk,
-            final_score=float(final[i]),
-            ce_score=float(scores[i]),
-            hybrid_score_0_100=float(item.get("hybrid_score_0_100", 0.0)),
-            cv_uid=int(item["cv_uid"]),
-            cv_id=item.get("cv_id"),
-            cv_text=ce_cv_text,
-            cv_summary=item.get("cv_summary"),
-            clean_cv_full=item.get("clean_cv_full"),
-        ))
+        out.append({
+            "rank": rnk,
+            "final_score": f,
+            "ce_score": ce,
+            "hybrid_score_0_100": float(item.get("hybrid_score_0_100", 0.0)),
+            "cv_uid": int(item["cv_uid"]),
+            "cv_id": item.get("cv_id"),
+            "cv_text": ce_cv_text,
+            "cv_summary": item.get("cv_summary"),
+            "clean_cv_full": item.get("clean_cv_full"),
+        })
 
     if AUTO_EXPLAIN:
-        # Convert to dicts so we can enrich with LLM reasons
-        ranked_dicts = [o.model_dump() for o in out]
 
         # Minimal shim carrying only what the explainer needs (no MatchReq changes)
         shim = SimpleNamespace(
@@ -249,7 +262,7 @@ def match(req: MatchReq):
             per_cv_char_budget=EXPLAIN_CHAR_BUDGET,
         )
 
-        enriched = explain_matches(shim, ranked_dicts)
+        enriched = explain_matches(shim, out)
         return enriched  # returns same list, but each item may include `explanation`
 
     return out
\ No newline at end of file
@@ -1,28 +1,159 @@
 # app/reranker.py
 import os
+import re
 import numpy as np
 from sentence_transformers import CrossEncoder
 import torch
 
+from .config import CE_BACKEND, CE_MULTI_GPU, CE_QUANTIZE, ONNX_CACHE_DIR
+from .encoder import amp_dtype
+
 # pick your model
 # app/reranker.py
 DEFAULT_RERANKER =  os.environ.get("CE_MODEL_ID", "BAAI/bge-reranker-base")
 DEVICE = "cuda" if torch.cuda.is_available() else "cpu"
+N_GPUS = torch.cuda.device_count() if DEVICE == "cuda" else 0
+if DEVICE == "cuda":   # TF32 tensor cores for fp32 matmuls (also in reranker_mp workers, which never import engine)
+    torch.set_float32_matmul_precision("high")
+    torch.backends.cuda.matmul.allow_tf32 = True
+    torch.backends.cudnn.allow_tf32 = True
+# with >1 GPU, callers either ship pairs to reranker_mp's process pool or score here under nn.DataParallel
+MULTI_GPU_POOL = N_GPUS > 1 and CE_MULTI_GPU == "pool"
 
 _CE = None
+_DP = None   # nn.DataParallel over _CE.model when CE_MULTI_GPU=dataparallel
+
+class OnnxCrossEncoder:
+    """ONNX Runtime stand-in for the parts of CrossEncoder that ce_scores uses (CE_BACKEND=ort).
+
+    The model is exported once to ONNX_CACHE_DIR/ce; later loads reuse the cached graph.
+    On CUDA the session runs with IO binding, so batches stay torch tensors on the device.
+    """
+
+    def __init__(self, model_id: str, device: str):
+        import onnxruntime as ort
+        from optimum.onnxruntime import ORTModelForSequenceClassification
+        from transformers import AutoTokenizer
+
+        out_dir = os.path.join(os.path.expanduser(ONNX_CACHE_DIR), "ce", re.sub(r"[^\w.-]+", "_", model_id))
+        if not os.path.exists(os.path.join(out_dir, "model.onnx")):
+            ORTModelForSequenceClassification.from_pretrained(model_id, export=True).save_pretrained(out_dir)
+            AutoTokenizer.from_pretrained(model_id).save_pretrained(out_dir)
+
+        cuda = str(device).startswith("cuda")
+        opts = ort.SessionOptions()
+        opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.model = ORTModelForSequenceClassification.from_pretrained(
+            out_dir,
+            provider="CUDAExecutionProvider" if cuda else "CPUExecutionProvider",
+            provider_options={"device_id": torch.device(device).index or 0} if cuda else None,
+            session_options=opts,
+            use_io_binding=cuda,
+        )
+        self.tokenizer = AutoTokenizer.from_pretrained(out_dir)
+        self.config = self.model.config
+        self.max_length = None   # as CrossEncoder: fall back to tokenizer.model_max_length
+        self.default_activation_function = torch.nn.Sigmoid() if self.config.num_labels == 1 else torch.nn.Identity()
+
+    def predict(self, pairs, batch_size: int = 32) -> np.ndarray:
+        if not pairs:
+            return np.zeros(0, dtype=np.float32)
+        return ce_scores(self, pairs, batch_size).cpu().numpy()
+
+def load_ce(model_id: str, device: str) -> CrossEncoder:
+    """CrossEncoder with bf16 weights on CUDA (fp16 before Ampere); CPU stays fp32 (int8 Linear with CE_QUANTIZE)."""
+    if CE_BACKEND == "ort":
+        return OnnxCrossEncoder(model_id, device)
+    if not str(device).startswith("cuda"):
+        ce = CrossEncoder(model_id, device=device)
+        if CE_QUANTIZE:
+            ce.model = torch.quantization.quantize_dynamic(ce.model, {torch.nn.Linear}, dtype=torch.qint8)
+        return ce
+    ce = CrossEncoder(model_id, device=device, automodel_args={"torch_dtype": amp_dtype()})
+    act = ce.default_activation_function
+    ce.default_activation_function = lambda x: act(x).float()   # NumPy has no bf16
+    return ce
 
 def _get_ce():
-    global _CE
+    global _CE, _DP
     if _CE is None:
-        _CE = CrossEncoder(DEFAULT_RERANKER, device=DEVICE)
+        _CE = load_ce(DEFAULT_RERANKER, DEVICE)
+        if N_GPUS > 1 and CE_MULTI_GPU == "dataparallel" and CE_BACKEND != "ort":
+            _DP = torch.nn.DataParallel(_CE.model)   # replicas on every GPU; each batch is scattered from cuda:0
     return _CE
 
-def rerank_pairs(pairs, batch_size=16):
-    """pairs: list[(query, doc)] -> np.array of scores"""
-    ce = _get_ce()
+def _fit_pair(lq: int, ld: int, budget: int):
+    """Lengths HF "longest_first" truncation leaves for a (query, doc) pair of lq + ld tokens."""
+    if lq + ld <= budget:
+        return lq, ld
+    small = min(lq, ld)
+    if 2 * small <= budget:             # only the longer side is cut
+        return (lq, budget - lq) if lq == small else (budget - ld, ld)
+    # both cut to ~half; an odd budget's extra token goes to the longer side (the doc on a tie)
+    return ((budget + 1) // 2, budget // 2) if lq > ld else (budget // 2, (budget + 1) // 2)
+
+def _pair_features(ce: CrossEncoder, pairs):
+    """Tokenize each distinct query once and all docs in one call, then assemble the pair inputs."""
+    tok = ce.tokenizer
+    budget = (ce.max_length or tok.model_max_length) - tok.num_special_tokens_to_add(pair=True)
+    queries = list(dict.fromkeys(q for q, _ in pairs))
+    q_ids = dict(zip(queries, tok(queries, add_special_tokens=False)["input_ids"]))
+    d_ids = tok([d for _, d in pairs], add_special_tokens=False)["input_ids"]
+    with_types = "token_type_ids" in tok.model_input_names
+    feats = []
+    for (q, _), d in zip(pairs, d_ids):
+        q = q_ids[q]
+        lq, ld = _fit_pair(len(q), len(d), budget)
+        f = {"input_ids": tok.build_inputs_with_special_tokens(q[:lq], d[:ld])}
+        if with_types:
+            f["token_type_ids"] = tok.create_token_type_ids_from_sequences(q[:lq], d[:ld])
+        feats.append(f)
+    return feats
+
+def ce_scores(ce: CrossEncoder, pairs, batch_size=16, model=None) -> torch.Tensor:
+    """
+    Same scores as ce.predict(pairs), as an fp32 tensor left on the model's device.
+    model: module to run instead of ce.model (e.g. a DataParallel wrapper of it).
+    """
+    feats = _pair_features(ce, pairs)
+    act = ce.default_activation_function
+    model = ce.model if model is None else model
+    # batch pairs of similar token length so each batch pads to little more than its own longest pair
+    order = np.argsort([len(f["input_ids"]) for f in feats], kind="stable")
+    out = []
     with torch.inference_mode():
-        scores = ce.predict(pairs, batch_size=batch_size)
-    return np.asarray(scores, dtype=float)
+        for i in range(0, len(feats), batch_size):
+            batch = ce.tokenizer.pad([feats[j] for j in order[i:i + batch_size]], return_tensors="pt").to(ce.model.device)
+            logits = act(model(**batch, return_dict=True).logits)
+            out.append(logits[:, 0] if ce.config.num_labels == 1 else logits)
+        sorted_scores = torch.cat(out).float()
+        scores = torch.empty_like(sorted_scores)
+        scores[torch.from_numpy(order).to(scores.device)] = sorted_scores   # back to input order
+    return scores
 
+def _local_scores(pairs, batch_size):
+    # under DataParallel, batch_size is per GPU
+    ce = _get_ce()
+    if _DP is None:
+        return ce_scores(ce, pairs, batch_size)
+    return ce_scores(ce, pairs, batch_size * len(_DP.device_ids), model=_DP)
 
+def rerank_pairs(pairs, batch_size=16):
+    """pairs: list[(query, doc)] -> np.array of scores"""
+    if not pairs:
+        return np.zeros(0, dtype=float)
+    return _local_scores(pairs, batch_size).cpu().numpy().astype(float)
 
+def rerank_topk(pairs, priors, alpha: float, k: int, batch_size=16):
+    """
+    CE + blend + top-k on the reranker's device; only k values come back to the host.
+    priors: per-pair prior in [0,1]. Returns (final[k], idx[k], ce[k]) as NumPy, best first.
+    """
+    logits = _local_scores(pairs, batch_size)
+    with torch.inference_mode():
+        pri = torch.as_tensor(priors, dtype=torch.float32, device=logits.device).clamp(0.0, 1.0)
+        lo, hi = logits.min(), logits.max()
+        ce_norm = torch.where(hi > lo, (logits - lo) / (hi - lo), torch.ones_like(logits))   # no host sync
+        final = alpha * ce_norm + (1.0 - alpha) * pri
+        vals, idx = final.topk(min(k, final.numel()))
+        return vals.cpu().numpy(), idx.cpu().numpy(), logits[idx].cpu().numpy()
@@ -1,40 +1,117 @@
-# app/reranker_mp.py (example skeleton)
+# app/reranker_mp.py
+# Multi-GPU CE: one persistent process per device keeps the model loaded; calls ship pair chunks over queues
+# and workers write scores into a shared-memory tensor.
+import atexit
+import itertools
+import queue
+import threading
 import torch
-from sentence_transformers import CrossEncoder
-from typing import List, Tuple
+import torch.multiprocessing as mp
+from typing import List, Optional, Tuple
 import numpy as np
-import multiprocessing as mp
 
-def _worker(device: str, pairs: List[Tuple[str,str]], model_id: str, batch_size: int, out_queue: mp.Queue, idx_range: Tuple[int,int]):
-    torch.cuda.set_device(device)
-    model = CrossEncoder(model_id, device=device)
-    lo, hi = idx_range
-    chunk = pairs[lo:hi]
-    scores = model.predict(chunk, batch_size=batch_size, convert_to_numpy=True, show_progress_bar=False)
-    out_queue.put((lo, hi, scores))
+from .reranker import DEFAULT_RERANKER, ce_scores, load_ce
 
-def rerank_pairs_multi(pairs, model_id: str, batch_size: int, devices: list):
+_CTX = mp.get_context("spawn")   # CUDA cannot be re-initialized in a forked child
+_POOL = None                     # (model_id, devices, procs, in_queue, out_queue)
+_POOL_LOCK = threading.Lock()    # one in-flight call at a time; results share out_queue
+_JOB_IDS = itertools.count()
+_POLL_S = 1.0                    # how often a waiting caller checks that the workers are still alive
+
+def _serve(device: str, model_id: str, in_queue, out_queue):
+    # failures are reported per job as (job_id, lo, error) so the caller raises instead of waiting forever
+    model, load_err = None, None
+    try:
+        torch.cuda.set_device(device)
+        model = load_ce(model_id, device)
+    except Exception as e:
+        load_err = f"{device}: loading {model_id} failed: {e!r}"
+    while True:
+        job = in_queue.get()
+        if job is None:
+            break
+        job_id, lo, chunk, batch_size, out = job
+        err = load_err
+        if model is not None:
+            try:
+                out[lo:lo + len(chunk)].copy_(ce_scores(model, chunk, batch_size))   # straight into the caller's shared buffer
+            except Exception as e:
+                err = f"{device}: {e!r}"
+        out_queue.put((job_id, lo, err))
+
+def shutdown_pool():
+    global _POOL
+    if _POOL is None:
+        return
+    _, _, procs, in_q, _ = _POOL
+    for _ in procs:
+        in_q.put(None)
+    for p in procs:
+        p.join()
+    _POOL = None
+
+def _kill_pool():
+    """Terminate the workers without waiting for their queued chunks (after a failed call)."""
+    global _POOL
+    if _POOL is None:
+        return
+    procs = _POOL[2]
+    _POOL = None
+    for p in procs:
+        if p.is_alive():
+            p.terminate()
+    for p in procs:
+        p.join(timeout=5)
+
+def start_pool(model_id: str, devices: list):
+    """Start (or reuse) one worker per device with model_id preloaded."""
+    global _POOL
+    if _POOL is not None and _POOL[0] == model_id and _POOL[1] == list(devices):
+        return _POOL
+    shutdown_pool()
+    in_q, out_q = _CTX.Queue(), _CTX.Queue()
+    procs = [_CTX.Process(target=_serve, args=(dev, model_id, in_q, out_q), daemon=True) for dev in devices]
+    for p in procs:
+        p.start()
+    _POOL = (model_id, list(devices), procs, in_q, out_q)
+    return _POOL
+
+atexit.register(shutdown_pool)
+
+def rerank_pairs_multi(pairs: List[Tuple[str, str]], model_id: str = DEFAULT_RERANKER,
+                       batch_size: int = 32, devices: Optional[list] = None):
     n = len(pairs)
     if n == 0:
         return np.zeros((0,), dtype=np.float32)
+    devices = devices or [f"cuda:{i}" for i in range(torch.cuda.device_count())]
 
-    # split pairs across devices
-    splits = np.array_split(np.arange(n), len(devices))
-    q = mp.Queue()
-    procs = []
-    for dev, idxs in zip(devices, splits):
-        if len(idxs) == 0: 
-            continue
-        p = mp.Process(target=_worker, args=(dev, pairs, model_id, batch_size, q, (int(idxs[0]), int(idxs[-1])+1)))
-        p.start()
-        procs.append(p)
-
-    out = np.zeros((n,), dtype=np.float32)
-    done = 0
-    while done < len(procs):
-        lo, hi, scores = q.get()
-        out[lo:hi] = scores
-        done += 1
-    for p in procs:
-        p.join()
-    return out
+    with _POOL_LOCK:
+        _, _, procs, in_q, out_q = start_pool(model_id, devices)
+        # split pairs across devices; idle workers pick up chunks from the shared queue
+        job_id = next(_JOB_IDS)
+        # workers write scores into this shared-memory buffer; the queue only carries its handle and (job, lo, err) signals
+        out = torch.zeros(n, dtype=torch.float32).share_memory_()
+        D = len(devices)
+        splits = [(i * n // D, (i + 1) * n // D) for i in range(D)]
+        splits = [(lo, hi) for lo, hi in splits if hi > lo]
+        for lo, hi in splits:
+            in_q.put((job_id, lo, pairs[lo:hi], batch_size, out))   # each worker unpickles only its slice
+
+        done = 0
+        try:
+            while done < len(splits):
+                try:
+                    jid, _, err = out_q.get(timeout=_POLL_S)
+                except queue.Empty:
+                    if not all(p.is_alive() for p in procs):
+                        raise RuntimeError("reranker_mp: a CE worker process died")
+                    continue
+                if jid != job_id:
+                    continue
+                if err is not None:
+                    raise RuntimeError(f"reranker_mp: CE worker failed: {err}")
+                done += 1
+        except BaseException:
+            _kill_pool()   # drop queued chunks and stale results; the next call starts fresh workers
+            raise
+    return out.numpy()
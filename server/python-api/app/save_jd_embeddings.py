@@ -9,6 +9,7 @@ from .config import (
     JD_PATH, JD_FMT, JD_TEXT_COL, JD_ID_COL,
     ENCODER_ID, USE_CUDA
 )
+from .encoder import amp_dtype
 
 def _expanduser_path(p: str) -> str:
     return os.path.abspath(os.path.expanduser(p))
@@ -38,33 +39,71 @@ def build_jd_unique(jd: pd.DataFrame) -> pd.DataFrame:
     return uniq
 
 def encode_texts(texts, model: SentenceTransformer, batch: int, device: str) -> np.ndarray:
-    vecs = []
-    with torch.inference_mode():
-        for i in range(0, len(texts), batch):
+    """Unit vectors as float16 rows, copied batch by batch into one preallocated array.
+    On CUDA each batch is copied out on a side stream into one of two pinned buffers,
+    so the device-to-host copy of batch N overlaps the encode of batch N+1."""
+    vecs = None
+    cuda = device == "cuda"
+    if cuda:
+        copy_stream = torch.cuda.Stream()
+        pinned, events, pending = [None, None], [None, None], [None, None]   # per buffer: host rows, copy-done event, (row, n)
+
+    def _drain(slot):
+        # wait for this buffer's copy, then move its rows into vecs
+        events[slot].synchronize()
+        lo, n = pending[slot]
+        vecs[lo:lo+n] = pinned[slot][:n].numpy()
+        pending[slot] = None
+
+    # bf16 autocast on CUDA (fp16 before Ampere), entered once for the whole run; disabled on CPU
+    with torch.inference_mode(), torch.amp.autocast("cuda", dtype=amp_dtype(), enabled=cuda):
+        for b, i in enumerate(range(0, len(texts), batch)):
             chunk = [str(t) for t in texts[i:i+batch]]
-            # autocast helps memory on CUDA; harmless on CPU when disabled
-            with torch.amp.autocast("cuda", enabled=(device=="cuda")):
-                embs = model.encode(
-                    chunk,
-                    batch_size=len(chunk),
-                    convert_to_numpy=True,
-                    normalize_embeddings=True,   # cosine-ready unit vectors
-                    show_progress_bar=False
-                )
-            vecs.append(embs.astype("float32"))
-            if device == "cuda":
-                torch.cuda.empty_cache()
-    return np.vstack(vecs) if vecs else np.zeros((0, 0), dtype="float32")
+            embs = model.encode(
+                chunk,
+                batch_size=len(chunk),
+                convert_to_tensor=True,      # stay on device until the fp16 cast
+                normalize_embeddings=True,   # cosine-ready unit vectors
+                show_progress_bar=False
+            )
+            if vecs is None:
+                vecs = np.empty((len(texts), embs.shape[1]), dtype=np.float16)
+                if cuda:
+                    pinned = [torch.empty((batch, embs.shape[1]), dtype=torch.float16, pin_memory=True) for _ in range(2)]
+            if not cuda:
+                vecs[i:i+len(chunk)] = embs.to(torch.float16).cpu().numpy()
+                continue
+            slot = b % 2
+            if pending[slot] is not None:
+                _drain(slot)   # buffer still holds batch b-2
+            half = embs.to(torch.float16)
+            copy_stream.wait_stream(torch.cuda.current_stream())
+            with torch.cuda.stream(copy_stream):
+                pinned[slot][:len(chunk)].copy_(half, non_blocking=True)
+                half.record_stream(copy_stream)   # keep the allocator off it until the copy is done
+                events[slot] = torch.cuda.Event()
+                events[slot].record(copy_stream)
+            pending[slot] = (i, len(chunk))
+        if cuda:
+            for slot in (0, 1):
+                if pending[slot] is not None:
+                    _drain(slot)
+    return vecs if vecs is not None else np.zeros((0, 0), dtype=np.float16)
 
 def main(out_dir: str = "./embeddings_out", batch: int = None):
     os.environ.setdefault("HF_HUB_DISABLE_PROGRESS_BARS", "1")
-    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True")
+    # the caching allocator reuses freed blocks across batches and trims itself past 80% use
+    os.environ.setdefault("PYTORCH_CUDA_ALLOC_CONF", "expandable_segments:True,garbage_collection_threshold:0.8")
 
     # device selection
     device = (
         "cuda" if (USE_CUDA == "cuda" or (USE_CUDA == "auto" and torch.cuda.is_available()))
         else "cpu"
     )
+    if device == "cuda":
+        torch.set_float32_matmul_precision("high")   # TF32 for any fp32 matmul left outside autocast
+        torch.backends.cuda.matmul.allow_tf32 = True
+        torch.backends.cudnn.allow_tf32 = True
 
     # sensible default batch
     if batch is None:
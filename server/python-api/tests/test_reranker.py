@@ -0,0 +1,40 @@
+# tests/test_reranker.py
+import itertools
+import os
+import sys
+
+import pytest
+
+# Add parent directory to path so `app` imports as a package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+pytest.importorskip("torch")
+pytest.importorskip("sentence_transformers")
+from tokenizers import Tokenizer, pre_tokenizers
+from tokenizers.models import WordLevel
+
+from app.reranker import _fit_pair
+
+
+def _longest_first(lq: int, ld: int, budget: int):
+    """(query, doc) lengths the fast tokenizer's longest_first truncation keeps."""
+    tok = Tokenizer(WordLevel({"[UNK]": 0, "w": 1}, unk_token="[UNK]"))
+    tok.pre_tokenizer = pre_tokenizers.WhitespaceSplit()
+    tok.enable_truncation(max_length=budget, strategy="longest_first")
+    enc = tok.encode(" ".join(["w"] * lq), " ".join(["w"] * ld), add_special_tokens=False)
+    return enc.sequence_ids.count(0), enc.sequence_ids.count(1)
+
+
+@pytest.mark.parametrize("budget", [1, 2, 7, 8, 15, 16, 509, 508])
+def test_fit_pair_matches_longest_first(budget):
+    lengths = sorted({0, 1, 2, 3, 4, 10, 20, budget // 2, budget // 2 + 1, budget, budget + 3})
+    for lq, ld in itertools.product(lengths, lengths):
+        assert _fit_pair(lq, ld, budget) == _longest_first(lq, ld, budget), (lq, ld, budget)
+
+
+def test_fit_pair_odd_budget_favours_longer_side():
+    # budget 7 cuts both sides; the extra token goes to the doc when it is longer or tied
+    assert _fit_pair(10, 20, 7) == (3, 4)
+    assert _fit_pair(10, 10, 7) == (3, 4)
+    assert _fit_pair(4, 20, 7) == (3, 4)
+    assert _fit_pair(20, 10, 7) == (4, 3)